@@ -1,13 +1,20 @@
 import argparse
 import datetime
+import functools
 import logging
+from typing import TYPE_CHECKING, Callable, Optional
+
 import pandas as pd
 import numpy as np
 from dateutil.relativedelta import relativedelta
 
-# main.py からクラスをインポート
-# ※ main.py と同じフォルダに置いてください
-from main import Config, SheetUploader
+# ledger.py / main.py からクラスをインポート
+# ※ ledger.py・main.py と同じフォルダに置いてください
+from ledger import Config, LedgerStore
+
+# main.py はブラウザ・スプレッドシートのライブラリを読み込むため、シートを使う時まで読み込まない
+if TYPE_CHECKING:
+    from main import SheetUploader
 
 # ログ設定
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
@@ -20,79 +27,213 @@ class InsightAnalyzer:
     THRESHOLD_AMOUNT = 5000  # 使いすぎ判定の金額閾値 (円)
     THRESHOLD_RATE = 20  # 使いすぎ判定の比率閾値 (%)
 
-    def __init__(self, df: pd.DataFrame):
+    def __init__(self, df: pd.DataFrame, aggregate: Optional[pd.DataFrame] = None):
         self.df = df
+        # 月×カテゴリの集計テーブル (LedgerStore.read_aggregate の形式)。あれば明細の代わりに使う
+        self.aggregate = aggregate
+
+    @classmethod
+    def from_aggregate(cls, aggregate: pd.DataFrame) -> "InsightAnalyzer":
+        """明細全体ではなく、集計テーブル (YearMonth × カテゴリ) から分析する"""
+        return cls(pd.DataFrame(), aggregate=aggregate)
+
+    @property
+    def empty(self) -> bool:
+        return self.df.empty if self.aggregate is None else self.aggregate.empty
 
     def analyze_monthly_changes(self, target_month: str) -> pd.DataFrame:
         """
         指定された月(target_month: 'YYYY-MM')とその前月を比較分析する
         """
         logging.info(f"家計インサイトを分析中... (対象: {target_month})")
+        return self.analyze_range(target_month, target_month).get(target_month, pd.DataFrame())
 
+    def analyze_range(self, from_month: str, to_month: str) -> dict:
+        """
+        from_month〜to_month ('YYYY-MM') の各月について前月比較をまとめて行い、{月: 分析結果} を返す。
+        カテゴリ×月の集計は期間全体で1回だけ行い、全月の比較を一括で計算する。
+        """
         # 日付オブジェクトを作成して前月を計算
         try:
-            target_date = datetime.datetime.strptime(target_month, "%Y-%m")
-            prev_date = target_date - relativedelta(months=1)
-            prev_month = prev_date.strftime("%Y-%m")
+            months = pd.period_range(
+                datetime.datetime.strptime(from_month, "%Y-%m"), datetime.datetime.strptime(to_month, "%Y-%m"), freq="M"
+            )
         except ValueError:
             logging.error("日付フォーマット不正。YYYY-MM 形式で指定してください。")
-            return pd.DataFrame()
-
-        logging.info(f"  - 比較対象: {target_month} vs {prev_month}")
-
-        # 1. ピボットテーブル作成
-        df_calc = self.df.copy()
-
-        # 対象月と前月のデータのみに絞る（高速化のため）
-        df_calc = df_calc[df_calc["YearMonth"].isin([target_month, prev_month])]
-
-        if df_calc.empty:
+            return {}
+        if months.empty:
+            logging.error(f"期間の指定が不正です: {from_month} 〜 {to_month}")
+            return {}
+
+        target_months = [m.strftime("%Y-%m") for m in months]
+        prev_months = [(m - 1).strftime("%Y-%m") for m in months]
+        all_months = [prev_months[0]] + target_months
+        if len(target_months) == 1:
+            logging.info(f"  - 比較対象: {target_months[0]} vs {prev_months[0]}")
+        else:
+            logging.info(f"  - 比較対象: {target_months[0]} 〜 {target_months[-1]} の各月 vs 前月")
+
+        # 1. カテゴリ×月の集計 (出金合計と件数) を期間全体で1回だけ作成
+        sums, counts = self._monthly_totals(all_months)
+        if sums.empty:
             logging.warning("  - 指定された期間のデータが存在しません。")
-            return pd.DataFrame()
-
-        pivot = df_calc.pivot_table(index="カテゴリ", columns="YearMonth", values="出金", aggfunc="sum", fill_value=0)
-
-        # 必要な列があるか確認
-        if target_month not in pivot.columns:
-            logging.warning(f"  - 対象月({target_month})のデータがありません。")
-            pivot[target_month] = 0
-        if prev_month not in pivot.columns:
-            # 前月データがない場合は0として比較
-            pivot[prev_month] = 0
-
-        # 2. 比較計算
-        analysis_df = pd.DataFrame(index=pivot.index)
-        analysis_df["当月"] = pivot[target_month]
-        analysis_df["前月"] = pivot[prev_month]
-        analysis_df["増減額"] = analysis_df["当月"] - analysis_df["前月"]
+            return {}
+
+        # 2. 比較計算 (全月分を縦に並べて一括で計算)
+        current = sums[target_months].to_numpy()
+        previous = sums[prev_months].to_numpy()
+        # 当月・前月のどちらかに明細があるカテゴリだけを対象にする
+        present = (counts[target_months].to_numpy() > 0) | (counts[prev_months].to_numpy() > 0)
+
+        long_df = pd.DataFrame(
+            {
+                "カテゴリ": np.repeat(sums.index.to_numpy(), len(target_months)),
+                "対象月": np.tile(target_months, len(sums.index)),
+                "前月": np.tile(prev_months, len(sums.index)),
+                "当月実績": current.ravel(),
+                "前月実績": previous.ravel(),
+            }
+        )[present.ravel()]
+
+        long_df["増減額"] = long_df["当月実績"] - long_df["前月実績"]
 
         # 増減率 (%)
-        analysis_df["増減率(%)"] = (
-            ((analysis_df["増減額"] / analysis_df["前月"]) * 100).where(analysis_df["前月"] > 0, 0).round(1)
+        long_df["増減率(%)"] = (
+            ((long_df["増減額"] / long_df["前月実績"]) * 100).where(long_df["前月実績"] > 0, 0).round(1)
         )
 
         # 3. 判定ロジック
         # 条件のリスト
         conditions = [
-            (analysis_df["増減額"] > self.THRESHOLD_AMOUNT) & (analysis_df["増減率(%)"] > self.THRESHOLD_RATE),
-            (analysis_df["増減額"] > 0),
-            (analysis_df["増減額"] == 0),
+            (long_df["増減額"] > self.THRESHOLD_AMOUNT) & (long_df["増減率(%)"] > self.THRESHOLD_RATE),
+            (long_df["増減額"] > 0),
+            (long_df["増減額"] == 0),
         ]
 
         # 条件に対応する値のリスト
         choices = ["⚠️使いすぎ", "増加", "-"]
 
         # どの条件にも当てはまらない場合のデフォルト値 ("減少/維持")
-        analysis_df["判定"] = np.select(conditions, choices, default="減少/維持")
+        long_df["判定"] = np.select(conditions, choices, default="減少/維持")
+
+        # 4. 月ごとに分割して整形
+        results = {}
+        grouped = dict(tuple(long_df.groupby("対象月", sort=False)))
+        for target_month, prev_month in zip(target_months, prev_months):
+            if counts[target_month].sum() == 0:
+                logging.warning(f"  - 対象月({target_month})のデータがありません。")
+            if target_month not in grouped:
+                continue
+
+            analysis_df = grouped[target_month].set_index("カテゴリ")
+            analysis_df = analysis_df[["当月実績", "前月実績", "増減額", "増減率(%)", "判定"]]
+
+            # 増減額の絶対値が大きい順、あるいは増加額が大きい順などでソート
+            analysis_df = analysis_df.sort_values(by="増減額", ascending=False).reset_index()
+
+            # カラム名をわかりやすく調整
+            results[target_month] = analysis_df.rename(
+                columns={"当月実績": f"{target_month}実績", "前月実績": f"{prev_month}実績"}
+            )
+
+        return results
+
+    def _monthly_totals(self, months: list) -> tuple:
+        """カテゴリ×月の出金合計と件数を返す (列は months の順、データのない月は0)"""
+        if self.aggregate is not None:
+            agg = self.aggregate[self.aggregate["YearMonth"].isin(months)]
+            if agg.empty:
+                return pd.DataFrame(), pd.DataFrame()
+            grouped = agg.set_index(["カテゴリ", "YearMonth"])[["出金", "件数"]].rename(
+                columns={"出金": "sum", "件数": "size"}
+            )
+        else:
+            df_calc = self.df[self.df["YearMonth"].isin(months)]
+            if df_calc.empty:
+                return pd.DataFrame(), pd.DataFrame()
+            grouped = df_calc.groupby(["カテゴリ", "YearMonth"])["出金"].agg(["sum", "size"])
+
+        sums = grouped["sum"].unstack(fill_value=0).reindex(columns=months, fill_value=0)
+        counts = grouped["size"].unstack(fill_value=0).reindex(columns=months, fill_value=0)
+        return sums, counts
+
+
+def uploader_factory(config: Config) -> Callable[[], "SheetUploader"]:
+    """最初に呼ばれた時に SheetUploader を作る関数を返す
+
+    gspread の読み込みと認証は、シートを読む・書く時まで行わない（ローカルストアだけで分析する場合は不要）。
+    """
+
+    @functools.cache
+    def get_uploader() -> "SheetUploader":
+        from main import SheetUploader
+
+        return SheetUploader(config)
 
-        # 4. 整形
-        # 増減額の絶対値が大きい順、あるいは増加額が大きい順などでソート
-        analysis_df = analysis_df.sort_values(by="増減額", ascending=False).reset_index()
+    return get_uploader
 
-        # カラム名をわかりやすく調整
-        analysis_df = analysis_df.rename(columns={"当月": f"{target_month}実績", "前月": f"{prev_month}実績"})
 
-        return analysis_df
+def build_analyzer(config: Config, get_uploader: Callable[[], "SheetUploader"], months: list) -> InsightAnalyzer:
+    """分析対象の各月とその前月を読み込んだ InsightAnalyzer を返す
+
+    ローカルストアがあれば月×カテゴリの集計テーブルだけを読み、無ければスプレッドシートの全明細を読む。
+    ストアへシートの既存履歴をまだ取り込んでいない場合は、最初に一度だけ取り込む。
+    """
+    store = LedgerStore(config)
+    sheet_df = None
+    try:
+        if store.enabled and not store.seeded:
+            sheet_df = get_uploader().fetch_all_data()
+            store.seed(sheet_df)
+
+        if store.months():
+            needed = set()
+            for month in months:
+                try:
+                    month_date = datetime.datetime.strptime(month, "%Y-%m")
+                except ValueError:
+                    # 不正な指定は分析側でエラーにする
+                    continue
+                needed.add(month)
+                needed.add((month_date - relativedelta(months=1)).strftime("%Y-%m"))
+            logging.info(f"ローカルストアの集計テーブルから読み込み中... ({', '.join(sorted(needed))})")
+            return InsightAnalyzer.from_aggregate(store.read_aggregate(sorted(needed)))
+    except (ImportError, OSError, ValueError) as e:
+        # pyarrow が無い・ストアが壊れている等。分析はシートの全明細からでもできる
+        logging.warning(f"ローカルストアを使えないため、スプレッドシートから読み込みます: {e}")
+
+    return InsightAnalyzer(sheet_df if sheet_df is not None else get_uploader().fetch_all_data())
+
+
+def run_batch(config: Config, get_uploader: Callable[[], "SheetUploader"], from_month: str, to_month: str):
+    """from_month〜to_month の各月を一括で分析し、月ごとのシートへまとめてアップロードする"""
+    logging.info(f"家計インサイトを一括分析中... ({from_month} 〜 {to_month})")
+    try:
+        months = pd.period_range(from_month, to_month, freq="M").strftime("%Y-%m").tolist()
+    except ValueError:
+        logging.error("日付フォーマット不正。YYYY-MM 形式で指定してください。")
+        return
+    if not months:
+        logging.error(f"期間の指定が不正です: {from_month} 〜 {to_month}")
+        return
+
+    analyzer = build_analyzer(config, get_uploader, months)
+    if analyzer.empty:
+        logging.error("データが取得できませんでした。終了します。")
+        return
+
+    insights = analyzer.analyze_range(from_month, to_month)
+    if not insights:
+        logging.info("分析結果が空のため、アップロードをスキップします。")
+        return
+
+    print("\n--- 分析結果プレビュー ---")
+    for month, insight_df in insights.items():
+        flagged = (insight_df["判定"] == "⚠️使いすぎ").sum()
+        print(f"{month}: {len(insight_df)}カテゴリ (⚠️使いすぎ {flagged}件)")
+    print("------------------------\n")
+
+    get_uploader().upload_insights(insights)
 
 
 def main():
@@ -101,6 +242,12 @@ def main():
     parser.add_argument(
         "--month", type=str, help="分析対象の月 (例: 2024-11)。指定しない場合は「先月」が自動選択されます。"
     )
+    parser.add_argument(
+        "--from", dest="from_month", type=str, help="一括分析の開始月 (例: 2024-01)。各月を個別のシートに出力します。"
+    )
+    parser.add_argument(
+        "--to", dest="to_month", type=str, help="一括分析の終了月 (例: 2024-12)。省略時は「先月」までです。"
+    )
     args = parser.parse_args()
 
     # --- 設定と準備 ---
@@ -111,15 +258,9 @@ def main():
         logging.error(e)
         return
 
-    uploader = SheetUploader(config)
-
-    # 1. データの読み込み (スプレッドシートから)
-    df_all = uploader.fetch_all_data()
-    if df_all.empty:
-        logging.error("データが取得できませんでした。終了します。")
-        return
+    get_uploader = uploader_factory(config)
 
-    # 2. 対象月の決定
+    # 1. 対象月の決定
     if args.month:
         target_month = args.month
     else:
@@ -130,8 +271,18 @@ def main():
         target_month = last_month_date.strftime("%Y-%m")
         logging.info(f"対象月が指定されていないため、先月 ({target_month}) を自動選択しました。")
 
+    # 期間指定がある場合は一括分析
+    if args.from_month or args.to_month:
+        run_batch(config, get_uploader, args.from_month or args.to_month, args.to_month or target_month)
+        return
+
+    # 2. データの読み込み (ローカルストアから対象月と前月の集計だけ。ストアが無ければスプレッドシートから)
+    analyzer = build_analyzer(config, get_uploader, [target_month])
+    if analyzer.empty:
+        logging.error("データが取得できませんでした。終了します。")
+        return
+
     # 3. 分析実行
-    analyzer = InsightAnalyzer(df_all)
     insight_df = analyzer.analyze_monthly_changes(target_month)
 
     # 4. 結果のアップロード
@@ -141,7 +292,7 @@ def main():
         print(insight_df.head())
         print("------------------------\n")
 
-        uploader.upload_insight(insight_df)
+        get_uploader().upload_insight(insight_df)
     else:
         logging.info("分析結果が空のため、アップロードをスキップします。")
 
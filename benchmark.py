@@ -0,0 +1,607 @@
+import argparse
+import dataclasses
+import glob
+import gzip
+import json
+import logging
+import os
+import platform
+import random
+import re
+import statistics
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from bs4 import BeautifulSoup
+
+from analyze import InsightAnalyzer
+from main import (
+    ROW_PARSER_BACKENDS,
+    Config,
+    DataProcessor,
+    RowBatch,
+    RowParser,
+    SheetUploader,
+    ZaimScraper,
+    create_row_parser,
+)
+
+# ログ設定
+logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+
+
+# --- 合成データ生成 ---
+CATEGORIES = ["食費", "日用雑貨", "交通", "交際費", "趣味・娯楽", "給与所得"]
+ACCOUNTS = ["お財布", "楽天カード", "三井住友銀行", "PayPay"]
+
+
+def make_page(rows: int, seed: int = 0) -> str:
+    """Zaimの履歴ページ (SearchResult-module) を模した合成HTMLを作る"""
+    rng = random.Random(seed)
+    parts = ['<html><body><div class="SearchResult-module__list___k2Jd9">']
+    for i in range(rows):
+        income = rng.random() < 0.1
+        account = f'<img src="/icon.png" alt="{rng.choice(ACCOUNTS)}">'
+        parts.append(
+            '<div class="SearchResult-module__body___a8Xq1">'
+            f'<div class="SearchResult-module__link___p0Rt3" data-url="/money/{100000000 + i}/edit">'
+            f'<div class="SearchResult-module__date___Lm2s8">{rng.randint(1, 12)}月{rng.randint(1, 28)}日'
+            f'{"（祝）" if rng.random() < 0.05 else ""}</div>'
+            '<div class="SearchResult-module__category___Qw7e2">'
+            f'<i class="icon"></i><span>{rng.choice(CATEGORIES)}</span> <span>その他</span></div>'
+            f'<div class="SearchResult-module__price___Zx4c6">¥{rng.randint(100, 50000):,}</div>'
+            f'<div class="SearchResult-module__fromAccount___Vb9n1">{"" if income else account}</div>'
+            f'<div class="SearchResult-module__toAccount___Nm3b5">{account if income else ""}</div>'
+            f'<div class="SearchResult-module__place___Hj6k0">店舗 {rng.randint(1, 300)}</div>'
+            f'<div class="SearchResult-module__name___Gf5d4"><!-- memo -->品名 {i}</div>'
+            "</div></div>"
+        )
+    parts.append("</div></body></html>")
+    return "".join(parts)
+
+
+def make_raw_ledger(rows: int, seed: int = 0) -> pd.DataFrame:
+    """スクレイピング直後 (DataProcessor.process 前) の形式の合成明細を作る"""
+    rng = random.Random(seed)
+    records = []
+    for i in range(rows):
+        scraped = pd.Timestamp(2020, 1, 1) + pd.DateOffset(months=rng.randint(0, 59))
+        suffix = rng.choice(["", "", "", "（祝）", "（振替休日）", "(月)"])
+        records.append(
+            {
+                "zaim_id": str(100000000 + i),
+                "日付": f"{scraped.month}月{rng.randint(1, 28)}日{suffix}",
+                "カテゴリ": rng.choice(CATEGORIES),
+                "金額": f"¥{rng.randint(100, 50000):,}",
+                "出金元": rng.choice(ACCOUNTS),
+                "入金先": "",
+                "お店": f"店舗 {rng.randint(1, 300)}",
+                "品名": f"品名 {i}",
+                "ScrapedYear": scraped.year,
+                "ScrapedMonth": scraped.month,
+            }
+        )
+    return pd.DataFrame(records)
+
+
+def make_large_raw_ledger(rows: int, seed: int = 0) -> pd.DataFrame:
+    """make_raw_ledger と同じ形式の合成明細を列単位で作る（100万行規模用）"""
+    rng = np.random.default_rng(seed)
+    offsets = rng.integers(0, 60, rows)
+    scraped_year = 2020 + offsets // 12
+    scraped_month = offsets % 12 + 1
+    income = rng.random(rows) < 0.1
+    accounts = np.array(ACCOUNTS)[rng.integers(0, len(ACCOUNTS), rows)]
+    suffix = np.array(["", "", "", "（祝）", "（振替休日）", "(月)"])[rng.integers(0, 6, rows)]
+    ids = np.arange(100000000, 100000000 + rows)
+    return pd.DataFrame(
+        {
+            "zaim_id": ids.astype(str),
+            "日付": pd.Series(scraped_month).astype(str)
+            + "月"
+            + pd.Series(rng.integers(1, 29, rows)).astype(str)
+            + "日"
+            + suffix,
+            "カテゴリ": np.array(CATEGORIES)[rng.integers(0, len(CATEGORIES), rows)],
+            "金額": pd.Series(rng.integers(100, 50001, rows)).map("¥{:,}".format),
+            "出金元": np.where(income, "", accounts),
+            "入金先": np.where(income, accounts, ""),
+            "お店": "店舗 " + pd.Series(rng.integers(1, 301, rows)).astype(str),
+            "品名": "品名 " + pd.Series(ids - 100000000).astype(str),
+            "ScrapedYear": scraped_year,
+            "ScrapedMonth": scraped_month,
+        }
+    )
+
+
+def load_fixtures(pattern: str) -> dict:
+    """保存済みの page_source (.html / .html.gz) を読み込む"""
+    pages = {}
+    for path in sorted(glob.glob(pattern)):
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, "rt", encoding="utf-8") as f:
+            pages[path] = f.read()
+    return pages
+
+
+# --- 比較用: 旧実装 (行ごとに find を7回呼ぶ版) ---
+def legacy_extract_row(row):
+    zaim_id = ""
+    link_elm = row.find(attrs={"data-url": True})
+    if link_elm:
+        match = re.search(r"/money/(\d+)", link_elm["data-url"])
+        if match:
+            zaim_id = match.group(1)
+    if not zaim_id:
+        return None
+
+    def text(name: str, default: str = "") -> str:
+        div = row.find("div", class_=re.compile(rf"SearchResult-module__{name}"))
+        return div.get_text(strip=True) if div else default
+
+    def alt(name: str) -> str:
+        div = row.find("div", class_=re.compile(rf"SearchResult-module__{name}"))
+        img = div.find("img") if div else None
+        return img.get("alt") if img else ""
+
+    return {
+        "zaim_id": zaim_id,
+        "日付": text("date"),
+        "カテゴリ": text("category"),
+        "金額": text("price", "0"),
+        "出金元": alt("fromAccount"),
+        "入金先": alt("toAccount"),
+        "お店": text("place"),
+        "品名": text("name"),
+    }
+
+
+def legacy_parse(html: str, data_store: dict):
+    soup = BeautifulSoup(html, "html.parser")
+    for row in soup.find_all("div", class_=re.compile(r"SearchResult-module__body")):
+        record = legacy_extract_row(row)
+        if record and record["zaim_id"] not in data_store:
+            data_store[record["zaim_id"]] = record
+
+
+def legacy_frame(data_store: dict) -> pd.DataFrame:
+    """旧実装の行dictを RowBatch と同じ型の DataFrame にして比較できるようにする"""
+    batch = RowBatch()
+    for record in data_store.values():
+        batch.add(tuple(record[col] for col in RowBatch.COLUMNS))
+    return batch.to_frame()
+
+
+def diff_ids(expected: pd.DataFrame, actual: pd.DataFrame) -> list:
+    """2つの解析結果で内容が異なる zaim_id を返す"""
+    merged = expected.astype(str).merge(actual.astype(str), how="outer", indicator=True)
+    return sorted(merged.loc[merged["_merge"] != "both", "zaim_id"].unique().tolist())
+
+
+# --- 比較用: 旧実装 (行ごとに apply で日付変換する版) ---
+LEGACY_MAX_ROWS = 100_000
+
+
+def legacy_parse_dates(df: pd.DataFrame) -> pd.Series:
+    def parse_date(row):
+        try:
+            text = str(row["日付"])
+            text = re.sub(r"（[^）]+）", "", text).strip()
+            text = text.replace("(", "").replace(")", "")
+            return pd.to_datetime(f"{row['ScrapedYear']}年{text}", format="%Y年%m月%d日", errors="coerce")
+        except Exception:
+            return pd.NaT
+
+    return df.apply(parse_date, axis=1)
+
+
+# --- スタブ (ブラウザ・Google Sheets を使わずにホットパスだけを動かす) ---
+class FakeDriver:
+    """page_source だけを持つ WebDriver の代わり"""
+
+    def __init__(self, html: str):
+        self.page_source = html
+
+
+class FakeWorksheet:
+    """SheetUploader が使う gspread.Worksheet の操作をメモリ上で再現する"""
+
+    id = 0
+    title = "Sheet1"
+
+    def __init__(self, values: list):
+        self.values = values
+
+    def get_all_values(self) -> list:
+        return [list(row) for row in self.values]
+
+
+class FakeSpreadsheet:
+    """値の書き込み (values.batchClear / values.batchUpdate) を FakeWorksheet に反映する（書式・並べ替えは無視）"""
+
+    RANGE_ROW = re.compile(r"!A(\d+)$")
+
+    def __init__(self, worksheet: FakeWorksheet):
+        self.worksheet = worksheet
+
+    def worksheets(self) -> list:
+        return [self.worksheet]
+
+    def batch_update(self, body: dict) -> dict:
+        return {"replies": []}
+
+    def values_batch_clear(self, body: dict):
+        self.worksheet.values = []
+
+    def values_batch_update(self, body: dict):
+        values = list(self.worksheet.values)
+        for data in body["data"]:
+            start = int(self.RANGE_ROW.search(data["range"]).group(1)) - 1
+            rows = data["values"]
+            values += [None] * (start + len(rows) - len(values))
+            values[start : start + len(rows)] = rows
+        self.worksheet.values = values
+
+
+class FakeClient:
+    def __init__(self, worksheet: FakeWorksheet):
+        self.worksheet = worksheet
+
+    def open_by_key(self, key: str) -> FakeSpreadsheet:
+        return FakeSpreadsheet(self.worksheet)
+
+
+def make_view_scraper(html: str, backend: str) -> ZaimScraper:
+    """ブラウザなしで _parse_current_view を呼べる ZaimScraper を作る"""
+    scraper = ZaimScraper.__new__(ZaimScraper)
+    scraper.config = Config()
+    scraper.driver = FakeDriver(html)
+    scraper.row_parser = create_row_parser(backend)
+    return scraper
+
+
+def make_uploader(sheet_values: list, upload_mode: str) -> SheetUploader:
+    """認証を行わず、FakeWorksheet に書き込む SheetUploader を作る"""
+    uploader = SheetUploader.__new__(SheetUploader)
+    uploader.config = dataclasses.replace(Config(), UPLOAD_MODE=upload_mode, SPREADSHEET_KEY="benchmark")
+    uploader.client = FakeClient(FakeWorksheet(sheet_values))
+    uploader._prefetched = None
+    uploader._spreadsheet = None
+    uploader._worksheets = None
+    uploader._batch = None
+    return uploader
+
+
+def to_sheet_values(df: pd.DataFrame) -> list:
+    """DataFrame をシートから読んだ時と同じ文字列の2次元リストにする"""
+    return [df.columns.tolist()] + df.astype(str).values.tolist()
+
+
+@contextmanager
+def quiet():
+    """計測中は main.py 側の INFO ログを止める"""
+    logging.disable(logging.INFO)
+    try:
+        yield
+    finally:
+        logging.disable(logging.NOTSET)
+
+
+# --- ベンチマーク ---
+def best_of(func, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def bench_parse(pages: dict, repeat: int) -> dict:
+    """旧実装と RowParser の解析時間を比較する（結果が一致することも確認する）"""
+    results = {}
+    parser = RowParser()
+    for name, html in pages.items():
+        expected, actual = {}, RowBatch()
+        legacy_parse(html, expected)
+        parser.parse(html, actual)
+        if not legacy_frame(expected).equals(actual.to_frame()):
+            raise AssertionError(f"{name}: 旧実装と解析結果が一致しません")
+
+        legacy = best_of(lambda: legacy_parse(html, {}), repeat)
+        single = best_of(lambda: parser.parse(html, RowBatch()), repeat)
+        logging.info(
+            f"[parse] {name}: {len(actual)}行 旧実装 {legacy * 1000:.1f}ms / "
+            f"RowParser {single * 1000:.1f}ms (x{legacy / single:.2f})"
+        )
+
+        # HTMLの構文解析を除いた、行の抽出処理だけの比較
+        rows = BeautifulSoup(html, "html.parser").find_all("div", class_=RowParser.ROW_PATTERN)
+        legacy = best_of(lambda: [legacy_extract_row(row) for row in rows], repeat)
+        single = best_of(lambda: [parser.extract_row(row) for row in rows], repeat)
+        logging.info(
+            f"[extract] {name}: 旧実装 {legacy * 1000:.1f}ms / RowParser {single * 1000:.1f}ms (x{legacy / single:.2f})"
+        )
+        results[f"extract/{name}"] = single
+    return results
+
+
+def check_backends(pages: dict, names: list, repeat: int) -> dict:
+    """各パーサーバックエンドが html.parser と同一の行を返すか確認し、解析時間を比較する"""
+    results = {}
+    reference = RowParser()
+    for name, html in pages.items():
+        batch = RowBatch()
+        reference.parse(html, batch)
+        expected = batch.to_frame()
+        for backend_name in names:
+            try:
+                backend = ROW_PARSER_BACKENDS[backend_name]()
+            except ImportError as e:
+                logging.warning(f"[backend] {backend_name} は未インストールのためスキップ: {e}")
+                continue
+
+            batch = RowBatch()
+            backend.parse(html, batch)
+            actual = batch.to_frame()
+            if not actual.equals(expected):
+                diff = diff_ids(expected, actual)
+                raise AssertionError(
+                    f"{name}: {backend_name} の解析結果が html.parser と異なります (zaim_id: {diff[:5]})"
+                )
+
+            elapsed = best_of(lambda: backend.parse(html, RowBatch()), repeat)
+            logging.info(f"[backend] {name}: {backend_name} {elapsed * 1000:.1f}ms ({len(actual)}行, 一致)")
+            results[f"backend/{backend_name}/{name}"] = elapsed
+    return results
+
+
+def bench_view(pages: dict, names: list, repeat: int) -> dict:
+    """ZaimScraper._parse_current_view (page_source の受け取りから行dictまで) を各バックエンドで計測する"""
+    results = {}
+    for name, html in pages.items():
+        for backend_name in names:
+            try:
+                ROW_PARSER_BACKENDS[backend_name]()
+            except ImportError:
+                continue
+            scraper = make_view_scraper(html, backend_name)
+            with quiet():
+                elapsed = best_of(lambda: scraper._parse_current_view(RowBatch()), repeat)
+            logging.info(f"[view] {name}: {backend_name} {elapsed * 1000:.1f}ms")
+            results[f"view/{backend_name}/{name}"] = elapsed
+    return results
+
+
+def bench_dates(sizes: list, repeat: int) -> dict:
+    """DataProcessor の日付変換を旧実装 (行ごとの apply) と比較する（旧実装は遅いため LEGACY_MAX_ROWS 行まで）"""
+    results = {}
+    for n in sizes:
+        if n > LEGACY_MAX_ROWS:
+            df = make_large_raw_ledger(n)
+            vectorized = best_of(lambda: DataProcessor.parse_dates(df), repeat)
+            logging.info(f"[dates] {n}行: 列単位 {vectorized * 1000:.0f}ms")
+            results[f"dates/{n}"] = vectorized
+            continue
+
+        df = make_raw_ledger(n)
+        expected = legacy_parse_dates(df)
+        actual = DataProcessor.parse_dates(df)
+        if not expected.astype("datetime64[ns]").equals(actual.astype("datetime64[ns]")):
+            raise AssertionError(f"{n}行: 旧実装と日付変換の結果が一致しません")
+
+        legacy = best_of(lambda: legacy_parse_dates(df), 1)
+        vectorized = best_of(lambda: DataProcessor.parse_dates(df), repeat)
+        logging.info(
+            f"[dates] {n}行: 旧実装 {legacy * 1000:.0f}ms / 列単位 {vectorized * 1000:.0f}ms (x{legacy / vectorized:.1f})"
+        )
+        results[f"dates/{n}"] = vectorized
+    return results
+
+
+def bench_process(ledgers: dict, repeat: int) -> dict:
+    """DataProcessor.process 全体を計測する"""
+    results = {}
+    for n, raw in ledgers.items():
+        with quiet():
+            elapsed = best_of(lambda: DataProcessor.process(raw), repeat)
+        logging.info(f"[process] {n}行: {elapsed * 1000:.0f}ms")
+        results[f"process/{n}"] = elapsed
+    return results
+
+
+def bench_upload(ledgers: dict, repeat: int) -> dict:
+    """SheetUploader.upload の重複排除・並べ替えを、n行の既存シートに直近分 (半分は既存行の更新) を書く想定で計測する"""
+    results = {}
+    for n, raw in ledgers.items():
+        with quiet():
+            clean = DataProcessor.process(raw)
+        batch = max(1, min(n // 10, 3000))
+        existing = to_sheet_values(clean.iloc[: n - batch // 2])
+        df_new = clean.iloc[n - batch :].copy()
+        df_new.loc[df_new.index[: batch // 4], "品名"] = "更新済み"
+
+        for mode in ("full", "delta"):
+            uploader = make_uploader(existing, mode)
+            with quiet():
+                if not uploader.upload(df_new.copy()):
+                    raise AssertionError(f"{n}行: upload ({mode}) が失敗しました")
+            written = uploader.client.worksheet.values
+            if len(written) - 1 != n:
+                raise AssertionError(f"{n}行: upload ({mode}) 後の件数が {len(written) - 1} 件です (期待値 {n})")
+
+            def run():
+                uploader.client.worksheet.values = existing
+                uploader.upload(df_new.copy())
+
+            with quiet():
+                elapsed = best_of(run, repeat)
+            logging.info(f"[upload] {n}行 + {batch}行 ({mode}): {elapsed * 1000:.0f}ms")
+            results[f"upload/{mode}/{n}"] = elapsed
+    return results
+
+
+def bench_analyze(ledgers: dict, repeat: int) -> dict:
+    """InsightAnalyzer.analyze_monthly_changes を、加工済みの明細全体から計測する"""
+    results = {}
+    for n, raw in ledgers.items():
+        with quiet():
+            clean = DataProcessor.process(raw)
+        target = clean["YearMonth"][clean["YearMonth"] != ""].max()
+        analyzer = InsightAnalyzer(clean)
+        with quiet():
+            elapsed = best_of(lambda: analyzer.analyze_monthly_changes(target), repeat)
+        logging.info(f"[analyze] {n}行 ({target}): {elapsed * 1000:.1f}ms")
+        results[f"analyze/{n}"] = elapsed
+    return results
+
+
+# 分析だけの起動 (import analyze) では読み込まれてはいけない重い依存
+HEAVY_MODULES = ("selenium", "selenium_helper", "bs4", "gspread", "oauth2client", "cryptography", "requests")
+ENTRY_POINTS = {"analyze": "import analyze", "main": "import main"}
+
+
+def import_times(statement: str) -> dict:
+    """python -X importtime で statement を実行し、{モジュール名: 累積インポート時間 (秒)} を返す"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        capture_output=True,
+        text=True,
+        check=True,
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:") :].split("|")
+        times[name.strip()] = int(cumulative) / 1_000_000
+    return times
+
+
+def bench_startup(repeat: int) -> dict:
+    """各エントリーポイントのコールドスタート時間を計測し、analyze が重い依存を読み込まないことを確認する"""
+    results = {}
+    for name, statement in ENTRY_POINTS.items():
+        runs = [import_times(statement) for _ in range(repeat)]
+        if name == "analyze":
+            loaded = sorted({m.split(".")[0] for m in runs[0]} & set(HEAVY_MODULES))
+            if loaded:
+                raise AssertionError(f"import analyze で重い依存が読み込まれています: {', '.join(loaded)}")
+
+        elapsed = min(run[name] for run in runs)
+        pandas_time = min(run.get("pandas", 0.0) for run in runs)
+        logging.info(f"[startup] {name}: {elapsed * 1000:.0f}ms (うち pandas {pandas_time * 1000:.0f}ms)")
+        results[f"startup/{name}"] = elapsed
+    return results
+
+
+# --- 計測履歴 ---
+def git_revision() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def load_history(path: str) -> list:
+    try:
+        with open(path, encoding="utf-8") as f:
+            return [json.loads(line) for line in f if line.strip()]
+    except OSError:
+        return []
+
+
+def find_regressions(results: dict, history: list, window: int, threshold: float) -> list:
+    """直近 window 回の中央値より threshold 倍以上遅くなった項目を返す"""
+    regressions = []
+    for key, elapsed in results.items():
+        past = [run["results"][key] for run in history[-window:] if key in run.get("results", {})]
+        if not past:
+            continue
+        baseline = statistics.median(past)
+        if baseline > 0 and elapsed > baseline * threshold:
+            regressions.append((key, baseline, elapsed))
+    return regressions
+
+
+def record_history(path: str, results: dict):
+    entry = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "results": results,
+    }
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+
+SUITES = ["startup", "parse", "backends", "view", "dates", "process", "upload", "analyze"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="スクレイパー等のホットパスのベンチマークを実行します。")
+    parser.add_argument("--rows", type=int, nargs="+", default=[100, 500], help="合成ページの行数")
+    parser.add_argument("--fixtures", type=str, help="保存済みHTMLのglobパターン (例: captures/*.html.gz)")
+    parser.add_argument("--repeat", type=int, default=3, help="計測の繰り返し回数 (最良値を採用)")
+    parser.add_argument(
+        "--backends", type=str, nargs="+", default=list(ROW_PARSER_BACKENDS), help="適合確認するパーサーバックエンド"
+    )
+    parser.add_argument(
+        "--ledger-rows", type=int, nargs="+", default=[10_000, 100_000], help="合成明細の行数 (1000000 まで想定)"
+    )
+    parser.add_argument("--only", type=str, nargs="+", choices=SUITES, default=SUITES, help="実行するベンチマーク")
+    parser.add_argument("--history", type=str, default="benchmark_history.jsonl", help="計測履歴 (JSONL)。空文字で無効")
+    parser.add_argument("--window", type=int, default=5, help="退行判定に使う直近の履歴件数")
+    parser.add_argument("--threshold", type=float, default=1.25, help="直近の中央値の何倍で退行とみなすか")
+    parser.add_argument("--fail-on-regression", action="store_true", help="退行があれば終了コード1で終了する")
+    args = parser.parse_args()
+
+    pages = {f"synthetic-{n}": make_page(n) for n in args.rows}
+    if args.fixtures:
+        pages.update(load_fixtures(args.fixtures))
+    ledgers = {}
+    if {"process", "upload", "analyze"} & set(args.only):
+        ledgers = {n: make_large_raw_ledger(n) for n in args.ledger_rows}
+
+    results = {}
+    if "startup" in args.only:
+        results.update(bench_startup(args.repeat))
+    if "parse" in args.only:
+        results.update(bench_parse(pages, args.repeat))
+    if "backends" in args.only:
+        results.update(check_backends(pages, args.backends, args.repeat))
+    if "view" in args.only:
+        results.update(bench_view(pages, args.backends, args.repeat))
+    if "dates" in args.only:
+        results.update(bench_dates(args.ledger_rows, args.repeat))
+    if "process" in args.only:
+        results.update(bench_process(ledgers, args.repeat))
+    if "upload" in args.only:
+        results.update(bench_upload(ledgers, args.repeat))
+    if "analyze" in args.only:
+        results.update(bench_analyze(ledgers, args.repeat))
+
+    if not args.history:
+        return
+    regressions = find_regressions(results, load_history(args.history), args.window, args.threshold)
+    for key, baseline, elapsed in regressions:
+        logging.warning(
+            f"[regression] {key}: {baseline * 1000:.1f}ms -> {elapsed * 1000:.1f}ms (x{elapsed / baseline:.2f})"
+        )
+    record_history(args.history, results)
+    logging.info(f"計測結果を {args.history} に追記しました ({len(results)}項目, 退行 {len(regressions)}件)")
+    if regressions and args.fail_on_regression:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,449 @@
+# 設定・明細の加工・ローカル明細ストア (ブラウザ・スプレッドシートのライブラリに依存しない部分)
+# main.py (取得・アップロード) と analyze.py (分析) の両方から使う
+import os
+import re
+import glob
+import logging
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+
+import pandas as pd
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+# --- 設定管理クラス ---
+@dataclass(frozen=True)
+class Config:
+    ZAIM_EMAIL: str = os.getenv("ZAIM_EMAIL", "")
+    ZAIM_PASS: str = os.getenv("ZAIM_PASS", "")
+    SPREADSHEET_KEY: str = os.getenv("SPREADSHEET_KEY", "")
+    JSON_KEYFILE: str = os.getenv("JSON_KEYFILE", "service_account.json")
+
+    URL_LOGIN: str = "https://auth.zaim.net/"
+    URL_HISTORY_BASE: str = "https://zaim.net/money"
+    # Cookie復元時にドメインを合わせるための軽量なページ
+    URL_COOKIE_ORIGIN: str = "https://zaim.net/favicon.ico"
+
+    GECKODRIVER_PATH: str = os.getenv("GECKODRIVER_PATH", "./geckodriver")
+    FIREFOX_BINARY_PATH: str = os.getenv("FIREFOX_BINARY_PATH", "")
+    FIREFOX_PROFILE_PATH: str = os.getenv("FIREFOX_PROFILE_PATH", "")
+
+    # 待機制御 (固定sleepの代わりに、実際の描画・遷移を上限付きで待つ)
+    WAIT_TIMEOUT: float = float(os.getenv("WAIT_TIMEOUT", "20"))
+    WAIT_QUIET_MS: int = int(os.getenv("WAIT_QUIET_MS", "800"))
+    WAIT_POLL_INTERVAL: float = float(os.getenv("WAIT_POLL_INTERVAL", "0.2"))
+    # 月ごとのアクセス間隔 (秒)。Zaimへの負荷を抑えたい場合に指定
+    REQUEST_INTERVAL: float = float(os.getenv("REQUEST_INTERVAL", "0"))
+
+    # 明細ページの取得方法: browser (Firefoxで描画) / http (ログイン済みCookieでHTTP取得し、取れない月だけブラウザを使う)
+    FETCH_ENGINE: str = os.getenv("FETCH_ENGINE", "browser")
+    # HTTP取得するURL ({month} は YYYYMM、{page} は1からのページ番号)。空文字の場合はブラウザと同じ履歴ページ
+    # 履歴画面が呼び出す JSON API も指定できる (HistoryJsonDecoder で明細に変換する)
+    HTTP_HISTORY_URL: str = os.getenv("HTTP_HISTORY_URL", "")
+    HTTP_POOL_SIZE: int = int(os.getenv("HTTP_POOL_SIZE", "4"))
+    HTTP_USER_AGENT: str = os.getenv(
+        "HTTP_USER_AGENT", "Mozilla/5.0 (X11; Linux x86_64; rv:128.0) Gecko/20100101 Firefox/128.0"
+    )
+
+    # ブラウザのウィンドウサイズ（一覧はスクロールしながら取り込むため、通常の大きさでよい）
+    WINDOW_WIDTH: int = int(os.getenv("WINDOW_WIDTH", "1280"))
+    WINDOW_HEIGHT: int = int(os.getenv("WINDOW_HEIGHT", "1200"))
+    # スクロール取得: 新しい行が SCROLL_IDLE_ROUNDS 回続けて増えなければ終了する
+    SCROLL_MAX_STEPS: int = int(os.getenv("SCROLL_MAX_STEPS", "200"))
+    SCROLL_IDLE_ROUNDS: int = int(os.getenv("SCROLL_IDLE_ROUNDS", "3"))
+    # Zaimが表示する月の明細件数の要素 (取得件数の突き合わせ用)。空文字で確認しない
+    MONTH_COUNT_SELECTOR: str = os.getenv("MONTH_COUNT_SELECTOR", "[class*='SearchResult-module__count']")
+
+    # 並列取得 (2以上で月リストを複数のブラウザに分配する)
+    SCRAPE_WORKERS: int = int(os.getenv("SCRAPE_WORKERS", "1"))
+    MAX_SCRAPE_WORKERS: int = int(os.getenv("MAX_SCRAPE_WORKERS", "4"))
+
+    # 明細HTMLの解析バックエンド: html.parser / lxml / selectolax
+    PARSER_BACKEND: str = os.getenv("PARSER_BACKEND", "html.parser")
+    # 明細の取り出し方: page_source (HTMLを転送してPythonで解析) / script (ブラウザ内で抽出してJSONで受け取る)
+    EXTRACT_MODE: str = os.getenv("EXTRACT_MODE", "page_source")
+
+    # 取得ページの記録/再生: record (月ごとの page_source を保存) / replay (保存済みページから再生)
+    CAPTURE_MODE: str = os.getenv("CAPTURE_MODE", "")
+    CAPTURE_DIR: str = os.getenv("CAPTURE_DIR", "captures")
+    # スプレッドシートへ書き込まず、加工結果をCSVに出力する
+    DRY_RUN: bool = os.getenv("DRY_RUN", "").lower() in ("1", "true", "yes")
+    DRY_RUN_OUTPUT: str = os.getenv("DRY_RUN_OUTPUT", "dry_run_output.csv")
+
+    # シートへの書き込み方: full (全件を書き直す) / delta (新規・変更行だけを書き込み、サーバー側で並べ替える)
+    UPLOAD_MODE: str = os.getenv("UPLOAD_MODE", "full")
+    # Sheets API のクォータ超過 (429)・一時エラー (5xx) を再試行する回数と、指数バックオフの初回待ち時間 (秒)
+    SHEET_RETRY_MAX: int = int(os.getenv("SHEET_RETRY_MAX", "5"))
+    SHEET_RETRY_BASE_DELAY: float = float(os.getenv("SHEET_RETRY_BASE_DELAY", "2"))
+
+    # ローカル明細ストア (YearMonth ごとの Parquet)。空文字で無効
+    STORE_DIR: str = os.getenv("STORE_DIR", "ledger_store")
+    # fetch_all_data の読み込みキャッシュ (シートの更新日時が変わらない限り再利用)。空文字で無効
+    SHEET_CACHE_DIR: str = os.getenv("SHEET_CACHE_DIR", ".sheet_cache")
+
+    # ストリーミング処理: 月ごとに取得→加工→保存・アップロードを流し、アップロードを次の月の取得と並行させる
+    STREAMING: bool = os.getenv("STREAMING", "").lower() in ("1", "true", "yes")
+    # 何ヶ月分たまったら書き込むか
+    STREAM_FLUSH_MONTHS: int = int(os.getenv("STREAM_FLUSH_MONTHS", "1"))
+
+    # セッションキャッシュ (空文字で無効)。暗号化キー未指定時は認証情報から導出する
+    SESSION_CACHE_PATH: str = os.getenv("SESSION_CACHE_PATH", ".zaim_session.bin")
+    SESSION_CACHE_KEY: str = os.getenv("SESSION_CACHE_KEY", "")
+
+    # 差分同期 (同期済みの月は再取得しない)。直近 INCREMENTAL_HOT_MONTHS ヶ月は編集され得るため毎回確認する
+    INCREMENTAL: bool = os.getenv("INCREMENTAL", "").lower() in ("1", "true", "yes")
+    SYNC_STATE_PATH: str = os.getenv("SYNC_STATE_PATH", ".zaim_sync_state.json")
+    INCREMENTAL_HOT_MONTHS: int = int(os.getenv("INCREMENTAL_HOT_MONTHS", "2"))
+
+    # 実行レポート (段階ごとの所要時間・件数のJSON)。空文字で無効
+    RUN_REPORT_PATH: str = os.getenv("RUN_REPORT_PATH", "run_report.json")
+    # プロファイルを取る段階 (カンマ区切り、all で全て)。cprofile / pyinstrument
+    PROFILE_STAGES: str = os.getenv("PROFILE_STAGES", "")
+    PROFILER: str = os.getenv("PROFILER", "cprofile")
+    PROFILE_DIR: str = os.getenv("PROFILE_DIR", "profiles")
+
+    # 常駐モード (main.py --daemon): 実行間隔 (秒、0でトリガー時のみ) と、ローカルからのトリガーの受付先
+    DAEMON_INTERVAL: float = float(os.getenv("DAEMON_INTERVAL", "3600"))
+    DAEMON_PORT: int = int(os.getenv("DAEMON_PORT", "0"))
+    DAEMON_SOCKET: str = os.getenv("DAEMON_SOCKET", "")
+    # HTTPトリガーに要求するトークン (Authorization: Bearer <token>)。空の場合はトークンなしで受け付ける
+    DAEMON_TOKEN: str = os.getenv("DAEMON_TOKEN", "")
+    # ブラウザを作り直す条件: 使用回数 / 起動直後からのメモリ増加量 (MB)。0で無効
+    BROWSER_RECYCLE_CYCLES: int = int(os.getenv("BROWSER_RECYCLE_CYCLES", "20"))
+    BROWSER_RECYCLE_MEMORY_MB: int = int(os.getenv("BROWSER_RECYCLE_MEMORY_MB", "1024"))
+
+    def validate(self):
+        if self.CAPTURE_MODE not in ("", "record", "replay"):
+            raise ValueError(f"CAPTURE_MODE が不正です: {self.CAPTURE_MODE} (record / replay)")
+        if self.FETCH_ENGINE not in ("browser", "http"):
+            raise ValueError(f"FETCH_ENGINE が不正です: {self.FETCH_ENGINE} (browser / http)")
+
+        # リプレイ時はZaimへ、DRY_RUN時はスプレッドシートへアクセスしない
+        required = []
+        if self.CAPTURE_MODE != "replay":
+            required += [self.ZAIM_EMAIL, self.ZAIM_PASS]
+        if not self.DRY_RUN:
+            required.append(self.SPREADSHEET_KEY)
+        if not all(required):
+            raise ValueError("必要な環境変数が設定されていません。")
+
+
+# --- データ加工クラス ---
+class DataProcessor:
+    # 加工時だけに使う列（シートには書き込まない）
+    INTERNAL_COLUMNS = ["ScrapedMonth"]
+
+    @staticmethod
+    def parse_dates(df: pd.DataFrame) -> pd.Series:
+        """「10月5日（土）」形式の日付を ScrapedYear と組み合わせ、列単位の処理でまとめて日付に変換する"""
+        # 「（祝）」「（振替休日）」など任意長の括弧内文字列にも対応
+        text = df["日付"].astype(str).str.replace(r"（[^）]+）", "", regex=True).str.strip()
+        text = text.str.replace("(", "", regex=False).str.replace(")", "", regex=False)
+
+        parts = text.str.extract(r"^(\d{1,2})月(\d{1,2})日$")
+        month = pd.to_numeric(parts[0], errors="coerce")
+        day = pd.to_numeric(parts[1], errors="coerce")
+        if "ScrapedYear" in df.columns:
+            year = pd.to_numeric(df["ScrapedYear"], errors="coerce")
+        else:
+            year = pd.Series(float("nan"), index=df.index)
+
+        # 取得した月と明細の月が年をまたいでいる場合（1月のページに12月の明細等）は年を補正する
+        if "ScrapedMonth" in df.columns:
+            diff = month - pd.to_numeric(df["ScrapedMonth"], errors="coerce")
+            year = year - (diff > 6).astype(int) + (diff < -6).astype(int)
+
+        return pd.to_datetime(pd.DataFrame({"year": year, "month": month, "day": day}), errors="coerce")
+
+    @staticmethod
+    def process(df: pd.DataFrame) -> pd.DataFrame:
+        logging.info("データを加工・結合中...")
+        df_clean = df.copy()
+
+        # 日付処理
+        if "日付" in df_clean.columns:
+            df_clean["date_obj"] = DataProcessor.parse_dates(df_clean)
+            df_clean["Year"] = df_clean["date_obj"].dt.year
+            df_clean["Month"] = df_clean["date_obj"].dt.month
+            df_clean["YearMonth"] = df_clean["date_obj"].dt.strftime("%Y-%m")
+            df_clean["date_obj"] = df_clean["date_obj"].dt.strftime("%Y-%m-%d")
+
+        # カテゴリのクリーニング
+        if "カテゴリ" in df_clean.columns:
+
+            def clean_cat(text):
+                jp_match = re.search(r"[^\x00-\x7F]+", text)
+                if jp_match:
+                    return text[jp_match.start() :]
+                return text
+
+            df_clean["カテゴリ"] = df_clean["カテゴリ"].apply(clean_cat)
+
+        # 金額処理 (RowBatch 由来のデータは取得時に整数化済み)
+        if "金額" in df_clean.columns and not pd.api.types.is_numeric_dtype(df_clean["金額"]):
+            df_clean["金額"] = df_clean["金額"].astype(str).str.replace("¥", "").str.replace(",", "")
+            df_clean["金額"] = pd.to_numeric(df_clean["金額"], errors="coerce").fillna(0)
+
+        # 出金と入金ロジックの整理
+        # 入金先がある場合は「入金」列、出金元がある場合は「出金」列に金額を入れる
+        df_clean["入金"] = 0
+        df_clean["出金"] = 0
+
+        # '入金先' カラムが存在し、かつ値が入っている(NaNでも空文字でもない)場合は「入金」扱い
+        # それ以外は「出金」扱いとする
+        if "入金先" in df_clean.columns:
+            mask_income = df_clean["入金先"].notna() & (df_clean["入金先"] != "")
+
+            # 入金フラグがTrueの行は、金額を「入金」列へコピー
+            df_clean.loc[mask_income, "入金"] = df_clean.loc[mask_income, "金額"]
+
+            # 入金フラグがFalseの行は、金額を「出金」列へコピー
+            df_clean.loc[~mask_income, "出金"] = df_clean.loc[~mask_income, "金額"]
+        else:
+            # 入金先カラムがない場合は全て出金扱い（安全策）
+            df_clean["出金"] = df_clean["金額"]
+
+        df_clean = df_clean.drop(columns=DataProcessor.INTERNAL_COLUMNS, errors="ignore")
+        # カテゴリ型の列は、欠損を埋める "" をカテゴリに加えておく
+        for col in df_clean.select_dtypes("category").columns:
+            if "" not in df_clean[col].cat.categories:
+                df_clean[col] = df_clean[col].cat.add_categories("")
+        return df_clean.fillna("")
+
+    AGGREGATE_COLUMNS = ["YearMonth", "カテゴリ", "出金", "入金", "件数"]
+
+    @staticmethod
+    def aggregate(df: pd.DataFrame) -> pd.DataFrame:
+        """明細を YearMonth × カテゴリ 単位の集計 (出金合計・入金合計・件数) にまとめる"""
+        if df.empty or not {"YearMonth", "カテゴリ"} <= set(df.columns):
+            return pd.DataFrame(columns=DataProcessor.AGGREGATE_COLUMNS)
+
+        df_calc = df[["YearMonth", "カテゴリ"]].copy()
+        for col in ["出金", "入金"]:
+            source = df[col] if col in df.columns else 0
+            df_calc[col] = pd.to_numeric(source, errors="coerce")
+        df_calc = df_calc.fillna({"出金": 0, "入金": 0})
+
+        aggregated = df_calc.groupby(["YearMonth", "カテゴリ"], observed=True).agg(
+            出金=("出金", "sum"), 入金=("入金", "sum"), 件数=("出金", "size")
+        )
+        return aggregated.reset_index()[DataProcessor.AGGREGATE_COLUMNS]
+
+
+# --- ローカル明細ストア ---
+class LedgerStore:
+    """YearMonth ごとに分割した Parquet に明細を保存する。分析はここから必要な月だけを読む（シートはその写し）"""
+
+    NUMERIC_COLUMNS = ["金額", "入金", "出金", "ScrapedYear"]
+    UNKNOWN_MONTH = "unknown"
+
+    def __init__(self, config: Config):
+        self.root = config.STORE_DIR
+        # DRY_RUN・リプレイの明細は正本に混ぜない（SyncState と同じく、読むだけで保存しない）
+        self.read_only = config.DRY_RUN or config.CAPTURE_MODE == "replay"
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.root)
+
+    def _partition_path(self, year_month: str) -> str:
+        return os.path.join(self.root, f"YearMonth={year_month}", "part.parquet")
+
+    def _partitions(self) -> list:
+        """保存済みのパーティション名 (YYYY-MM と unknown)"""
+        if not self.enabled:
+            return []
+        paths = glob.glob(self._partition_path("*"))
+        return sorted(os.path.basename(os.path.dirname(p)).split("=", 1)[1] for p in paths)
+
+    def months(self) -> list:
+        """保存済みの月 (YYYY-MM) を古い順に返す"""
+        return [n for n in self._partitions() if n != self.UNKNOWN_MONTH]
+
+    @classmethod
+    def to_typed(cls, df: pd.DataFrame) -> pd.DataFrame:
+        """加工済みデータ（シート書き込み用の文字列混じり）を分析で使う型にそろえる"""
+        df = df.copy()
+        # カテゴリ型は月ごとにカテゴリが異なるため、保存・分析では通常の文字列として扱う
+        for col in df.select_dtypes("category").columns:
+            df[col] = df[col].astype(str)
+        for col in cls.NUMERIC_COLUMNS:
+            if col in df.columns:
+                df[col] = pd.to_numeric(df[col].astype(str).str.replace(",", ""), errors="coerce").fillna(0)
+        for col in ["Year", "Month"]:
+            if col in df.columns:
+                df[col] = pd.to_numeric(df[col], errors="coerce").astype("Int64")
+        if "date_obj" in df.columns:
+            df["date_obj"] = pd.to_datetime(df["date_obj"], errors="coerce")
+        if "zaim_id" in df.columns:
+            df["zaim_id"] = df["zaim_id"].astype(str)
+        return df
+
+    def _read_partition(self, year_month: str) -> pd.DataFrame:
+        path = self._partition_path(year_month)
+        if not os.path.exists(path):
+            return pd.DataFrame()
+        return pd.read_parquet(path)
+
+    @staticmethod
+    def _write_parquet(df: pd.DataFrame, path: str):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        df.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, path)
+
+    def _index_path(self) -> str:
+        return os.path.join(self.root, "zaim_id_index.parquet")
+
+    def _load_index(self) -> pd.DataFrame:
+        """zaim_id → 保存先の月 の索引を読む。無ければ全パーティションの zaim_id 列だけを読んで作る"""
+        path = self._index_path()
+        if os.path.exists(path):
+            return pd.read_parquet(path)
+        frames = [
+            pd.read_parquet(self._partition_path(name), columns=["zaim_id"]).assign(YearMonth=name)
+            for name in self._partitions()
+        ]
+        if not frames:
+            return pd.DataFrame({"zaim_id": pd.Series(dtype=str), "YearMonth": pd.Series(dtype=str)})
+        index = pd.concat(frames, ignore_index=True)
+        index["zaim_id"] = index["zaim_id"].astype(str)
+        return index
+
+    def _remove_moved(self, index: pd.DataFrame, locations: pd.Series) -> dict:
+        """locations (zaim_id → 保存する月) と別の月に残っている同じ zaim_id の行を削除する
+
+        日付が変わって月をまたいだ明細の古い行が残らないようにする。{削除した月: 削除後のパーティション} を返す。
+        """
+        located = index[index["zaim_id"].isin(locations.index)]
+        moved = located[located["YearMonth"].to_numpy() != locations.reindex(located["zaim_id"]).to_numpy()]
+
+        remaining_by_month = {}
+        for year_month, ids in moved.groupby("YearMonth")["zaim_id"]:
+            existing = self._read_partition(year_month)
+            if existing.empty:
+                continue
+            remaining = existing[~existing["zaim_id"].astype(str).isin(set(ids))]
+            path = self._partition_path(year_month)
+            if remaining.empty:
+                os.remove(path)
+            else:
+                self._write_parquet(remaining, path)
+            remaining_by_month[year_month] = remaining
+            logging.info(
+                f"ローカルストア: 別の月へ移動した明細 {len(existing) - len(remaining)}件を {year_month} から削除しました"
+            )
+        return remaining_by_month
+
+    def write(self, df: pd.DataFrame) -> list:
+        """月ごとのパーティションへ zaim_id 単位で上書き保存し、更新した月のリストを返す
+
+        同じ zaim_id が別の月のパーティションにあれば、そちらからは削除する (明細の日付が月をまたいで変わった場合)。
+        """
+        if not self.enabled or df.empty:
+            return []
+        if self.read_only:
+            logging.info(f"DRY_RUN/リプレイのためローカルストアへは保存しません ({len(df)}件)")
+            return []
+
+        df = self.to_typed(df).drop_duplicates(subset=["zaim_id"], keep="last")
+        if "YearMonth" in df.columns:
+            keys = df["YearMonth"].replace("", self.UNKNOWN_MONTH).fillna(self.UNKNOWN_MONTH)
+        else:
+            keys = pd.Series(self.UNKNOWN_MONTH, index=df.index)
+        locations = pd.Series(keys.to_numpy(), index=df["zaim_id"].to_numpy())
+        index = self._load_index()
+
+        written = []
+        month_aggregates = {}
+        for year_month, part in df.groupby(keys, sort=True):
+            existing = self._read_partition(year_month)
+            combined = pd.concat([existing, part], ignore_index=True) if not existing.empty else part
+            combined = combined.drop_duplicates(subset=["zaim_id"], keep="last")
+
+            self._write_parquet(combined, self._partition_path(year_month))
+            written.append(year_month)
+            # 集計は置き換え後のパーティション全体から作り直す（重複排除で置き換わった明細も正しく反映される）
+            if year_month != self.UNKNOWN_MONTH:
+                month_aggregates[year_month] = DataProcessor.aggregate(combined)
+
+        # 移動元の月の集計も、削除後のパーティションから作り直す
+        for year_month, remaining in self._remove_moved(index, locations).items():
+            if year_month != self.UNKNOWN_MONTH:
+                month_aggregates[year_month] = DataProcessor.aggregate(remaining)
+        index = index[~index["zaim_id"].isin(locations.index)]
+        index = pd.concat(
+            [index, pd.DataFrame({"zaim_id": locations.index, "YearMonth": locations.to_numpy()})], ignore_index=True
+        )
+        self._write_parquet(index, self._index_path())
+
+        self._update_aggregate(month_aggregates)
+        logging.info(f"ローカルストアへ保存しました: {len(df)}件 ({', '.join(written)})")
+        return written
+
+    def _seed_marker_path(self) -> str:
+        return os.path.join(self.root, ".seeded_from_sheet")
+
+    @property
+    def seeded(self) -> bool:
+        """シートの既存履歴を取り込み済みか"""
+        return os.path.exists(self._seed_marker_path())
+
+    def seed(self, df: pd.DataFrame) -> list:
+        """シートから読んだ全明細のうち、ストアにまだ無い明細を取り込み、取り込み済みの印を残す
+
+        main はストアへ直近の月しか書かないため、ストア導入前からシートにある履歴はここで一度だけ取り込む。
+        """
+        if not self.enabled or self.read_only or df.empty or "zaim_id" not in df.columns:
+            return []
+        known = set(self._load_index()["zaim_id"])
+        missing = df[~df["zaim_id"].astype(str).isin(known)]
+        written = self.write(missing) if not missing.empty else []
+        os.makedirs(self.root, exist_ok=True)
+        with open(self._seed_marker_path(), "w", encoding="utf-8") as f:
+            f.write(datetime.now().isoformat(timespec="seconds"))
+        logging.info(f"シートの既存履歴をローカルストアへ取り込みました: {len(missing)}件")
+        return written
+
+    def _aggregate_path(self) -> str:
+        return os.path.join(self.root, "aggregate.parquet")
+
+    def _update_aggregate(self, month_aggregates: dict):
+        """更新した月の行だけを差し替えて集計テーブルを保存する"""
+        path = self._aggregate_path()
+        if os.path.exists(path):
+            current = pd.read_parquet(path)
+            current = current[~current["YearMonth"].isin(month_aggregates.keys())]
+        else:
+            # 集計テーブルがまだ無い場合は、既存のパーティション全体から一度だけ作る
+            current = DataProcessor.aggregate(self.read([m for m in self.months() if m not in month_aggregates]))
+
+        frames = [f for f in [current, *month_aggregates.values()] if not f.empty]
+        if not frames:
+            frames = [pd.DataFrame(columns=DataProcessor.AGGREGATE_COLUMNS)]
+        updated = pd.concat(frames, ignore_index=True).sort_values(["YearMonth", "カテゴリ"], ignore_index=True)
+        self._write_parquet(updated, path)
+
+    def read_aggregate(self, months: Optional[list] = None) -> pd.DataFrame:
+        """月×カテゴリの集計テーブルを読み込む（None の場合は全期間）"""
+        path = self._aggregate_path()
+        if not os.path.exists(path):
+            if not self.months():
+                return pd.DataFrame(columns=DataProcessor.AGGREGATE_COLUMNS)
+            self._update_aggregate({})
+
+        aggregated = pd.read_parquet(path)
+        if months is not None:
+            aggregated = aggregated[aggregated["YearMonth"].isin(months)]
+        return aggregated.reset_index(drop=True)
+
+    def read(self, months: Optional[list] = None) -> pd.DataFrame:
+        """指定した月のパーティションだけを読み込む（None の場合は全期間）"""
+        targets = self.months() if months is None else months
+        frames = [df for df in (self._read_partition(m) for m in targets) if not df.empty]
+        if not frames:
+            return pd.DataFrame()
+        return pd.concat(frames, ignore_index=True)
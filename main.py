@@ -1,72 +1,223 @@
 import os
 import time
 import re
+import json
+import argparse
+import base64
+import cProfile
+import glob
+import gzip
+import hashlib
+import hmac
 import logging
+import queue
+import random
+import shutil
+import signal
+import socketserver
+import tempfile
+import threading
 import traceback
-from dataclasses import dataclass
+from contextlib import ExitStack, contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, replace
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from typing import Optional
 
 import pandas as pd
+import requests
 import gspread
 from oauth2client.service_account import ServiceAccountCredentials
-from dotenv import load_dotenv
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from bs4 import BeautifulSoup, CData, NavigableString, Tag
+from cryptography.fernet import Fernet, InvalidToken
 
 from selenium_helper.selenium_helper import SeleniumBrowser
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
+from selenium.common.exceptions import JavascriptException, StaleElementReferenceException, TimeoutException
+
+from ledger import Config, DataProcessor, LedgerStore
 
 # ログ設定
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 
-load_dotenv()
 
+# --- 実行計測 ---
+@dataclass
+class StageStats:
+    calls: int = 0
+    wall_sec: float = 0.0
+    cpu_sec: float = 0.0
+    rows: int = 0
+    bytes: int = 0
+
+
+class StageTimer:
+    """処理段階ごとの実時間・CPU時間・件数・バイト数を集計し、JSONの実行レポートとして出力する
+
+    複数スレッドから同時に計測してよい（CPU時間は計測したスレッド自身の分だけを数える）。
+    PROFILE_STAGES に指定した段階は cProfile / pyinstrument で包み、結果を PROFILE_DIR に保存する。
+    """
+
+    def __init__(self, config: Optional[Config] = None):
+        self.reset(config)
+
+    def reset(self, config: Optional[Config] = None):
+        self.config = config or Config()
+        self.started_at = datetime.now()
+        self._wall_start = time.perf_counter()
+        self._cpu_start = time.process_time()
+        self._lock = threading.Lock()
+        self._profiling = False
+        self.stages: dict[str, StageStats] = {}
+        self.sections: dict = {}
+        self.profile_targets = {name.strip() for name in self.config.PROFILE_STAGES.split(",") if name.strip()}
+
+    @contextmanager
+    def stage(self, name: str):
+        """with stage_timer.stage("parse") as s: ... s.rows = n のように使う"""
+        current = StageStats(calls=1)
+        profiler = self._start_profiler(name)
+        wall, cpu = time.perf_counter(), time.thread_time()
+        try:
+            yield current
+        finally:
+            current.wall_sec = time.perf_counter() - wall
+            current.cpu_sec = time.thread_time() - cpu
+            if profiler is not None:
+                self._stop_profiler(name, profiler)
+            with self._lock:
+                total = self.stages.setdefault(name, StageStats())
+                total.calls += 1
+                total.wall_sec += current.wall_sec
+                total.cpu_sec += current.cpu_sec
+                total.rows += current.rows
+                total.bytes += current.bytes
+
+    def _start_profiler(self, name: str):
+        if "all" not in self.profile_targets and name not in self.profile_targets:
+            return None
+        # プロファイラは同時に1つしか有効にできないため、入れ子・並行の段階は計測だけ行う
+        with self._lock:
+            if self._profiling:
+                return None
+            self._profiling = True
 
-# --- 1. 設定管理クラス ---
-@dataclass(frozen=True)
-class Config:
-    ZAIM_EMAIL: str = os.getenv("ZAIM_EMAIL", "")
-    ZAIM_PASS: str = os.getenv("ZAIM_PASS", "")
-    SPREADSHEET_KEY: str = os.getenv("SPREADSHEET_KEY", "")
-    JSON_KEYFILE: str = os.getenv("JSON_KEYFILE", "service_account.json")
+        try:
+            if self.config.PROFILER == "pyinstrument":
+                try:
+                    from pyinstrument import Profiler
+
+                    profiler = Profiler()
+                    profiler.start()
+                    return profiler
+                except ImportError:
+                    logging.warning("pyinstrument が未インストールのため cProfile を使用します")
+            profiler = cProfile.Profile()
+            profiler.enable()
+            return profiler
+        except (ValueError, RuntimeError) as e:
+            logging.warning(f"プロファイラを開始できませんでした ({name}): {e}")
+            with self._lock:
+                self._profiling = False
+            return None
 
-    URL_LOGIN: str = "https://auth.zaim.net/"
-    URL_HISTORY_BASE: str = "https://zaim.net/money"
+    def _stop_profiler(self, name: str, profiler):
+        try:
+            os.makedirs(self.config.PROFILE_DIR, exist_ok=True)
+            stem = os.path.join(self.config.PROFILE_DIR, f"{name}-{datetime.now().strftime('%Y%m%d-%H%M%S-%f')}")
+            if isinstance(profiler, cProfile.Profile):
+                profiler.disable()
+                path = f"{stem}.prof"
+                profiler.dump_stats(path)
+            else:
+                profiler.stop()
+                path = f"{stem}.html"
+                with open(path, "w", encoding="utf-8") as f:
+                    f.write(profiler.output_html())
+            logging.info(f"プロファイル結果を保存しました: {path}")
+        except OSError as e:
+            logging.warning(f"プロファイル結果の保存に失敗: {e}")
+        finally:
+            with self._lock:
+                self._profiling = False
+
+    def add_section(self, name: str, data):
+        """待機時間の集計など、段階以外の情報をレポートに含める"""
+        self.sections[name] = data
+
+    def report(self) -> dict:
+        with self._lock:
+            stages = {
+                name: {k: round(v, 4) if isinstance(v, float) else v for k, v in asdict(stats).items()}
+                for name, stats in self.stages.items()
+            }
+        return {
+            "started_at": self.started_at.isoformat(timespec="seconds"),
+            "wall_sec": round(time.perf_counter() - self._wall_start, 4),
+            "cpu_sec": round(time.process_time() - self._cpu_start, 4),
+            "stages": stages,
+            **self.sections,
+        }
+
+    def log_report(self):
+        report = self.report()
+        logging.info(f"実行時間レポート: 合計 {report['wall_sec']:.2f}秒 (CPU {report['cpu_sec']:.2f}秒)")
+        for name, s in report["stages"].items():
+            logging.info(
+                f"  - {name}: {s['calls']}回, 実時間 {s['wall_sec']:.2f}秒, CPU {s['cpu_sec']:.2f}秒, "
+                f"{s['rows']}件, {s['bytes'] / 1024:.0f}KB"
+            )
+
+    def write_report(self, path: Optional[str] = None):
+        path = self.config.RUN_REPORT_PATH if path is None else path
+        if not path:
+            return
+        tmp_path = f"{path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.report(), f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, path)
+            logging.info(f"実行レポートを保存しました: {path}")
+        except OSError as e:
+            logging.warning(f"実行レポートの保存に失敗: {e}")
 
-    GECKODRIVER_PATH: str = os.getenv("GECKODRIVER_PATH", "./geckodriver")
-    FIREFOX_BINARY_PATH: str = os.getenv("FIREFOX_BINARY_PATH", "")
-    FIREFOX_PROFILE_PATH: str = os.getenv("FIREFOX_PROFILE_PATH", "")
 
-    def validate(self):
-        if not all([self.ZAIM_EMAIL, self.ZAIM_PASS, self.SPREADSHEET_KEY]):
-            raise ValueError("必要な環境変数が設定されていません。")
+# 各クラスから共通で使う計測器。main() の開始時に設定を渡して初期化し直す
+stage_timer = StageTimer()
 
 
-# --- 2. ブラウザ管理クラス ---
+# --- 1. ブラウザ管理クラス ---
 class BrowserManager:
-    def __init__(self, config: Config, headless: bool = True):
+    def __init__(self, config: Config, headless: bool = True, profile_path: Optional[str] = None):
         self.config = config
         self.headless = headless
+        # 並列実行時はセッションごとにコピーしたプロファイルを使う
+        self.profile_path = profile_path or config.FIREFOX_PROFILE_PATH
         self.helper_browser: Optional[SeleniumBrowser] = None
 
     def __enter__(self) -> SeleniumBrowser:
-        logging.info("Firefoxを起動中...")
-        browser_setting = {
-            "browser_path": self.config.FIREFOX_BINARY_PATH,
-            "browser_profile": self.config.FIREFOX_PROFILE_PATH,
-        }
-        self.helper_browser = SeleniumBrowser(
-            geckodriver_path=self.config.GECKODRIVER_PATH,
-            headless=self.headless,
-            browser_setting=browser_setting,
-            set_size=False,
-        )
-
-        # 数百件の明細を一気に入れるため、超縦長サイズに設定
-        target_height = 15000
-        logging.info(f"ウィンドウサイズを拡張します (1280x{target_height})")
-        self.helper_browser.browser.set_window_size(1280, target_height)
+        with stage_timer.stage("browser_launch"):
+            logging.info("Firefoxを起動中...")
+            browser_setting = {
+                "browser_path": self.config.FIREFOX_BINARY_PATH,
+                "browser_profile": self.profile_path,
+            }
+            self.helper_browser = SeleniumBrowser(
+                geckodriver_path=self.config.GECKODRIVER_PATH,
+                headless=self.headless,
+                browser_setting=browser_setting,
+                set_size=False,
+            )
+
+            # 一覧はスクロールしながら取り込むため、通常サイズのウィンドウでよい
+            width, height = self.config.WINDOW_WIDTH, self.config.WINDOW_HEIGHT
+            logging.info(f"ウィンドウサイズを設定します ({width}x{height})")
+            self.helper_browser.browser.set_window_size(width, height)
 
         return self.helper_browser
 
@@ -75,19 +226,562 @@ class BrowserManager:
             logging.info("Firefoxを終了します")
             self.helper_browser.close_selenium()
 
+    @staticmethod
+    def memory_mb(driver) -> Optional[float]:
+        """geckodriver とその子孫 (Firefox本体・コンテンツプロセス) のRSS合計 (MB)。測れない環境では None"""
+        service = getattr(driver, "service", None)
+        process = getattr(service, "process", None)
+        if process is None or not os.path.isdir("/proc"):
+            return None
+
+        children = {}
+        for entry in os.listdir("/proc"):
+            if not entry.isdigit():
+                continue
+            try:
+                with open(f"/proc/{entry}/stat", encoding="utf-8") as f:
+                    ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+            except (OSError, ValueError, IndexError):
+                continue
+            children.setdefault(ppid, []).append(int(entry))
+
+        total = 0
+        stack = [process.pid]
+        while stack:
+            pid = stack.pop()
+            try:
+                with open(f"/proc/{pid}/statm", encoding="utf-8") as f:
+                    total += int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+            except (OSError, ValueError, IndexError):
+                continue
+            stack.extend(children.get(pid, []))
+        return total / 1024 / 1024
+
+
+# --- 2. 待機制御クラス ---
+@dataclass
+class WaitRecord:
+    name: str
+    elapsed: float
+    timed_out: bool
+
+
+class ReadinessWaiter:
+    """固定sleepの代わりに、URL遷移・DOMの静止・行数の安定といった実際のシグナルを待つ"""
+
+    # コンテナに MutationObserver を仕掛け、最後の変化からの経過ミリ秒と現在の行数を返す
+    _JS_PROBE = """
+        const el = arguments[0];
+        if (!el.__zaimObserver) {
+            el.__zaimLastMutation = Date.now();
+            el.__zaimObserver = new MutationObserver(() => { el.__zaimLastMutation = Date.now(); });
+            el.__zaimObserver.observe(el, {childList: true, subtree: true, attributes: true, characterData: true});
+        }
+        const rows = el.querySelectorAll("div[class*='SearchResult-module__body']").length;
+        return [Date.now() - el.__zaimLastMutation, rows];
+    """
+
+    def __init__(self, driver, config: Config):
+        self.driver = driver
+        self.config = config
+        self.records: list[WaitRecord] = []
+
+    def _run(self, name: str, predicate, timeout: Optional[float] = None) -> bool:
+        """predicate が真になるまで待つ。上限を超えた場合は警告して処理を続行する"""
+        timeout = self.config.WAIT_TIMEOUT if timeout is None else timeout
+        start = time.perf_counter()
+        timed_out = False
+        try:
+            WebDriverWait(
+                self.driver,
+                timeout,
+                poll_frequency=self.config.WAIT_POLL_INTERVAL,
+                ignored_exceptions=(StaleElementReferenceException, JavascriptException),
+            ).until(predicate)
+        except TimeoutException:
+            timed_out = True
+            logging.warning(f"待機がタイムアウトしました: {name} (上限 {timeout}秒)")
+
+        elapsed = time.perf_counter() - start
+        self.records.append(WaitRecord(name, elapsed, timed_out))
+        logging.debug(f"待機完了: {name} ({elapsed:.2f}秒)")
+        return not timed_out
+
+    def page_loaded(self, name: str = "page_load") -> bool:
+        return self._run(name, lambda d: d.execute_script("return document.readyState") == "complete")
+
+    def url_leaves(self, fragment: str, name: str) -> bool:
+        return self._run(name, lambda d: fragment not in d.current_url)
+
+    def url_contains_any(self, fragments: tuple, name: str) -> bool:
+        return self._run(name, lambda d: any(f in d.current_url for f in fragments))
+
+    def dom_quiet(self, container, name: str = "dom_quiet") -> bool:
+        """コンテナ内のDOM変化が WAIT_QUIET_MS 以上止まり、行数が前回ポーリングから変わらなくなるまで待つ"""
+        state = {"rows": -1}
+
+        def settled(driver):
+            idle_ms, rows = driver.execute_script(self._JS_PROBE, container)
+            stable = rows == state["rows"]
+            state["rows"] = rows
+            return stable and idle_ms >= self.config.WAIT_QUIET_MS
+
+        return self._run(name, settled)
+
+    def report(self) -> dict:
+        """待機の種類ごとに、回数・合計/最大時間・タイムアウト回数を集計する"""
+        summary = {}
+        for r in self.records:
+            s = summary.setdefault(r.name, {"count": 0, "total_sec": 0.0, "max_sec": 0.0, "timeouts": 0})
+            s["count"] += 1
+            s["total_sec"] += r.elapsed
+            s["max_sec"] = max(s["max_sec"], r.elapsed)
+            s["timeouts"] += int(r.timed_out)
+        return summary
+
+    def log_report(self):
+        if not self.records:
+            return
+        total = sum(r.elapsed for r in self.records)
+        logging.info(f"待機時間レポート: 合計 {total:.2f}秒 ({len(self.records)}回)")
+        for name, s in self.report().items():
+            logging.info(
+                f"  - {name}: {s['count']}回, 合計 {s['total_sec']:.2f}秒, "
+                f"最大 {s['max_sec']:.2f}秒, タイムアウト {s['timeouts']}回"
+            )
+
+
+# --- 3. セッションキャッシュクラス ---
+class SessionCache:
+    """ログイン後のCookieを暗号化してローカルに保存し、次回起動時のログインを省略する"""
+
+    _KDF_SALT = b"zaim_asset_tracker.session_cache"
+    _KDF_ITERATIONS = 200_000
+
+    def __init__(self, config: Config):
+        self.config = config
+        self.path = config.SESSION_CACHE_PATH
+        self.stats_path = f"{self.path}.stats.json"
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path)
+
+    def _fernet(self) -> Fernet:
+        secret = self.config.SESSION_CACHE_KEY or f"{self.config.ZAIM_EMAIL}:{self.config.ZAIM_PASS}"
+        key = hashlib.pbkdf2_hmac("sha256", secret.encode("utf-8"), self._KDF_SALT, self._KDF_ITERATIONS)
+        return Fernet(base64.urlsafe_b64encode(key))
+
+    def load(self) -> Optional[list]:
+        """保存済みCookieを返す。未保存・復号失敗・全て期限切れの場合は None"""
+        if not self.enabled or not os.path.exists(self.path):
+            return None
+        try:
+            with open(self.path, "rb") as f:
+                cookies = json.loads(self._fernet().decrypt(f.read()))
+        except (InvalidToken, ValueError, OSError) as e:
+            logging.warning(f"セッションキャッシュを読み込めませんでした（破棄します）: {type(e).__name__} {e}")
+            self.clear()
+            return None
+
+        now = time.time()
+        cookies = [c for c in cookies if "expiry" not in c or c["expiry"] > now]
+        return cookies or None
+
+    def save(self, cookies: list):
+        if not self.enabled:
+            return
+        token = self._fernet().encrypt(json.dumps(cookies).encode("utf-8"))
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(token)
+        os.chmod(tmp_path, 0o600)
+        os.replace(tmp_path, self.path)
+        logging.info("セッションをキャッシュに保存しました")
+
+    def clear(self):
+        if self.enabled and os.path.exists(self.path):
+            os.remove(self.path)
+
+    def record(self, hit: bool):
+        """ヒット/ミスを記録し、累計のヒット率をログに出す"""
+        if not self.enabled:
+            return
+        stats = {"hits": 0, "misses": 0}
+        try:
+            with open(self.stats_path, encoding="utf-8") as f:
+                stats.update(json.load(f))
+        except (OSError, ValueError):
+            pass
+
+        stats["hits" if hit else "misses"] += 1
+        total = stats["hits"] + stats["misses"]
+        try:
+            with open(self.stats_path, "w", encoding="utf-8") as f:
+                json.dump(stats, f)
+        except OSError as e:
+            logging.warning(f"セッションキャッシュ統計の保存に失敗: {e}")
+
+        logging.info(
+            f"セッションキャッシュ: {'ヒット' if hit else 'ミス'} "
+            f"(累計ヒット率 {stats['hits'] / total:.0%}, {stats['hits']}/{total})"
+        )
+
+
+# --- 4. 明細行パーサー ---
+class RowBatch:
+    """1ヶ月分の明細を列ごとのリストで保持する（行ごとの dict は作らない）
+
+    行は COLUMNS の順のタプルで add() する。zaim_id と金額は追加時に整数へ変換し、
+    to_frame() で型付きの DataFrame (int64 / category) を1回だけ作る。
+    """
+
+    __slots__ = ("_ids", "_columns")
+
+    COLUMNS = ("zaim_id", "日付", "カテゴリ", "金額", "出金元", "入金先", "お店", "品名")
+    DTYPES = {"zaim_id": "int64", "金額": "int64", "カテゴリ": "category", "出金元": "category", "入金先": "category"}
+
+    def __init__(self):
+        self._ids: set = set()
+        self._columns: tuple = tuple([] for _ in self.COLUMNS)
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __contains__(self, zaim_id) -> bool:
+        return int(zaim_id) in self._ids
+
+    @staticmethod
+    def parse_amount(text: str) -> int:
+        """「¥1,200」形式の金額を整数にする（読めない場合は 0）"""
+        try:
+            return int(text.replace("¥", "").replace(",", ""))
+        except ValueError:
+            return 0
+
+    def add(self, record: tuple) -> bool:
+        """未登録の zaim_id の行を追加する。追加した場合 True"""
+        zaim_id = int(record[0])
+        if zaim_id in self._ids:
+            return False
+        self._ids.add(zaim_id)
+        zaim_ids, dates, categories, amounts, from_accounts, to_accounts, places, names = self._columns
+        zaim_ids.append(zaim_id)
+        dates.append(record[1])
+        categories.append(record[2])
+        amounts.append(self.parse_amount(record[3]))
+        from_accounts.append(record[4])
+        to_accounts.append(record[5])
+        places.append(record[6])
+        names.append(record[7])
+        return True
+
+    def to_frame(self) -> pd.DataFrame:
+        return pd.DataFrame(
+            {
+                col: pd.Series(values, dtype=self.DTYPES.get(col, object))
+                for col, values in zip(self.COLUMNS, self._columns)
+            }
+        )
+
+
+class RowParser:
+    """SearchResult-module__body の各行を1回だけ走査し、8項目をまとめて取り出す (html.parser バックエンド)
+
+    他のバックエンドはこのクラスを継承し、_rows() と extract_row() を差し替える。
+    どのバックエンドも同じ形式の行タプル (RowBatch.COLUMNS の順) を返す。
+    """
+
+    name = "html.parser"
+
+    ROW_PATTERN = re.compile(r"SearchResult-module__body")
+    ZAIM_ID_PATTERN = re.compile(r"/money/(\d+)")
+    # クラス名の接頭辞 → 項目名 の対応表（1回の正規表現検索で振り分ける）
+    FIELD_PATTERN = re.compile(r"SearchResult-module__(date|category|price|fromAccount|toAccount|place|name)")
+    TEXT_FIELDS = {"date": "日付", "category": "カテゴリ", "price": "金額", "place": "お店", "name": "品名"}
+    ACCOUNT_FIELDS = {"fromAccount": "出金元", "toAccount": "入金先"}
+    # get_text() と同じく、コメント等を除いた本文の文字列だけを対象にする
+    STRING_TYPES = (NavigableString, CData)
+
+    def parse(self, html: str, data_store: RowBatch):
+        """ページ全体のHTMLから行を取り出し、未登録の zaim_id の行を data_store に追加する"""
+        for row in self._rows(html):
+            try:
+                record = self.extract_row(row)
+                if record:
+                    data_store.add(record)
+            except Exception as e:
+                logging.error(f"行データの解析エラー: {e}")
+
+    def _rows(self, html: str) -> list:
+        soup = BeautifulSoup(html, "html.parser")
+        return soup.find_all("div", class_=self.ROW_PATTERN)
+
+    def _match_fields(self, classes) -> list:
+        fields = []
+        for cls in classes or ():
+            match = self.FIELD_PATTERN.search(cls)
+            if match:
+                fields.append(match.group(1))
+        return fields
+
+    def _build_record(self, data_url: Optional[str], texts: dict, accounts: dict) -> Optional[tuple]:
+        match = self.ZAIM_ID_PATTERN.search(data_url) if data_url else None
+        if not match:
+            return None
+
+        def text(field: str, default: str = "") -> str:
+            return "".join(texts[field]) if field in texts else default
+
+        return (
+            match.group(1),
+            text("date"),
+            text("category"),
+            text("price", "0"),
+            accounts.get("fromAccount", ""),
+            accounts.get("toAccount", ""),
+            text("place"),
+            text("name"),
+        )
+
+    def extract_row(self, row: Tag) -> Optional[tuple]:
+        """行のサブツリーを深さ優先で1回だけ辿る。各項目は最初に現れた該当divの内容を採用する"""
+        data_url = None
+        texts = {}
+        accounts = {}
+        claimed = set()
+
+        # (ノード, そのノードを内包している項目divの項目名タプル)
+        stack = [(child, ()) for child in reversed(row.contents)]
+        while stack:
+            node, owners = stack.pop()
+            if isinstance(node, Tag):
+                if data_url is None and node.has_attr("data-url"):
+                    data_url = node["data-url"]
+
+                if node.name == "div":
+                    for field in self._match_fields(node.get("class")):
+                        if field in claimed:
+                            continue
+                        claimed.add(field)
+                        owners = owners + (field,)
+                        if field in self.TEXT_FIELDS:
+                            texts[field] = []
+                elif node.name == "img":
+                    for field in owners:
+                        if field in self.ACCOUNT_FIELDS and field not in accounts:
+                            accounts[field] = node.get("alt")
+
+                stack.extend((child, owners) for child in reversed(node.contents))
+            elif owners and type(node) in self.STRING_TYPES:
+                self._add_text(texts, owners, node)
+
+        return self._build_record(data_url, texts, accounts)
+
+    @staticmethod
+    def _add_text(texts: dict, owners: tuple, text: str):
+        stripped = text.strip()
+        if stripped:
+            for field in owners:
+                if field in texts:
+                    texts[field].append(stripped)
+
+
+class LxmlRowParser(RowParser):
+    """lxml.html (C実装) で構文解析し、RowParser と同じ1パス走査で行を取り出す"""
+
+    name = "lxml"
+
+    def __init__(self):
+        import lxml.html
+
+        self._lxml_html = lxml.html
+
+    def _rows(self, html: str) -> list:
+        doc = self._lxml_html.fromstring(html)
+        return doc.xpath("//div[contains(@class, 'SearchResult-module__body')]")
+
+    def extract_row(self, row) -> Optional[tuple]:
+        data_url = None
+        texts = {}
+        accounts = {}
+        claimed = set()
+
+        # lxml では要素直後の文字列 (tail) が親の内容になるため、子孫を辿り終えてから処理する
+        stack = []
+        for child in reversed(row):
+            stack.append((None, child.tail, ()))
+            stack.append((child, None, ()))
+        while stack:
+            node, tail, owners = stack.pop()
+            if node is None:
+                if owners and tail:
+                    self._add_text(texts, owners, tail)
+                continue
+            # コメント・処理命令は tag が文字列ではない
+            if not isinstance(node.tag, str):
+                continue
+
+            if data_url is None and "data-url" in node.attrib:
+                data_url = node.attrib["data-url"]
+
+            if node.tag == "div":
+                for field in self._match_fields(node.get("class", "").split()):
+                    if field in claimed:
+                        continue
+                    claimed.add(field)
+                    owners = owners + (field,)
+                    if field in self.TEXT_FIELDS:
+                        texts[field] = []
+            elif node.tag == "img":
+                for field in owners:
+                    if field in self.ACCOUNT_FIELDS and field not in accounts:
+                        accounts[field] = node.get("alt")
 
-# --- 3. ZaimScraper クラス---
+            if owners and node.text:
+                self._add_text(texts, owners, node.text)
+            for child in reversed(node):
+                stack.append((None, child.tail, owners))
+                stack.append((child, None, owners))
+
+        return self._build_record(data_url, texts, accounts)
+
+
+class SelectolaxRowParser(RowParser):
+    """selectolax (lexbor) のCSSセレクタで各項目を直接取り出す"""
+
+    name = "selectolax"
+
+    ROW_SELECTOR = "div[class*='SearchResult-module__body']"
+
+    def __init__(self):
+        from selectolax.lexbor import LexborHTMLParser
+
+        self._parser_class = LexborHTMLParser
+        self._field_selectors = {
+            field: f"div[class*='SearchResult-module__{field}']"
+            for field in list(self.TEXT_FIELDS) + list(self.ACCOUNT_FIELDS)
+        }
+
+    def _rows(self, html: str) -> list:
+        return self._parser_class(html).css(self.ROW_SELECTOR)
+
+    def extract_row(self, row) -> Optional[tuple]:
+        link = row.css_first("[data-url]")
+        data_url = link.attributes.get("data-url") if link is not None else None
+
+        texts = {}
+        for field in self.TEXT_FIELDS:
+            div = row.css_first(self._field_selectors[field])
+            if div is not None:
+                texts[field] = [div.text(deep=True, separator="", strip=True)]
+
+        accounts = {}
+        for field in self.ACCOUNT_FIELDS:
+            div = row.css_first(self._field_selectors[field])
+            img = div.css_first("img") if div is not None else None
+            if img is not None:
+                accounts[field] = img.attributes.get("alt")
+
+        return self._build_record(data_url, texts, accounts)
+
+
+ROW_PARSER_BACKENDS = {
+    RowParser.name: RowParser,
+    LxmlRowParser.name: LxmlRowParser,
+    SelectolaxRowParser.name: SelectolaxRowParser,
+}
+
+
+def create_row_parser(name: str) -> RowParser:
+    """設定名からパーサーを作る。ライブラリが未インストールの場合は html.parser にフォールバックする"""
+    if name not in ROW_PARSER_BACKENDS:
+        raise ValueError(f"未知のパーサーバックエンドです: {name} (選択肢: {', '.join(ROW_PARSER_BACKENDS)})")
+    try:
+        return ROW_PARSER_BACKENDS[name]()
+    except ImportError as e:
+        logging.warning(f"パーサーバックエンド {name} を利用できないため html.parser を使用します: {e}")
+        return RowParser()
+
+
+class ScriptRowExtractor:
+    """ページ内でJavaScriptを1回実行して必要な8項目だけを受け取る（page_source の転送と再解析を省く）"""
+
+    # 文字列の扱いは get_text(strip=True) に合わせる（テキストノードごとにtrimして連結、script等は除外）
+    _JS_EXTRACT = r"""
+        const skip = new Set(["SCRIPT", "STYLE", "TEMPLATE", "NOSCRIPT"]);
+        const text = (el) => {
+            if (!el) return null;
+            const walker = document.createTreeWalker(el, NodeFilter.SHOW_TEXT);
+            let out = "";
+            for (let node = walker.nextNode(); node; node = walker.nextNode()) {
+                if (skip.has(node.parentNode.nodeName)) continue;
+                const t = node.nodeValue.trim();
+                if (t) out += t;
+            }
+            return out;
+        };
+        const field = (row, name) => row.querySelector(`div[class*='SearchResult-module__${name}']`);
+        const alt = (row, name) => {
+            const div = field(row, name);
+            const img = div ? div.querySelector("img") : null;
+            return img ? img.getAttribute("alt") : "";
+        };
+        const result = [];
+        for (const row of document.querySelectorAll("div[class*='SearchResult-module__body']")) {
+            const link = row.querySelector("[data-url]");
+            const match = link ? /\/money\/(\d+)/.exec(link.getAttribute("data-url")) : null;
+            if (!match) continue;
+            result.push([
+                match[1],
+                text(field(row, "date")),
+                text(field(row, "category")),
+                text(field(row, "price")),
+                alt(row, "fromAccount"),
+                alt(row, "toAccount"),
+                text(field(row, "place")),
+                text(field(row, "name")),
+            ]);
+        }
+        return result;
+    """
+
+    def collect(self, driver, data_store: RowBatch) -> int:
+        """表示中の行を data_store に追加し、新たに追加した件数を返す"""
+        added = 0
+        for zaim_id, date, category, price, from_acc, to_acc, place, name in driver.execute_script(self._JS_EXTRACT):
+            record = (
+                zaim_id,
+                date if date is not None else "",
+                category if category is not None else "",
+                price if price is not None else "0",
+                from_acc,
+                to_acc,
+                place if place is not None else "",
+                name if name is not None else "",
+            )
+            added += data_store.add(record)
+        return added
+
+
+# --- 5. ZaimScraper クラス---
 class ZaimScraper:
     def __init__(self, helper: SeleniumBrowser, config: Config):
         self.helper = helper
         self.driver = helper.browser
         self.config = config
-        self.wait = WebDriverWait(self.driver, 20)
+        self.wait = WebDriverWait(self.driver, config.WAIT_TIMEOUT)
+        self.waiter = ReadinessWaiter(self.driver, config)
+        self.row_parser = create_row_parser(config.PARSER_BACKEND)
+        self.script_extractor = ScriptRowExtractor()
+        self.capture = PageCapture(config) if config.CAPTURE_MODE == "record" else None
+        # 月ごとの取得件数と、Zaimが表示している件数 (実行レポート用)
+        self.completeness: dict = {}
 
     def login(self):
         logging.info("Zaimへログインを開始します...")
         self.helper.recur_selenium_get(self.config.URL_LOGIN)
-        time.sleep(3)
+        self.waiter.page_loaded("login_page")
 
         current_url = self.driver.current_url
         if "auth.zaim.net" in current_url:
@@ -99,7 +793,7 @@ class ZaimScraper:
                     self.config.ZAIM_PASS
                 )
                 self.driver.find_element(By.CSS_SELECTOR, "input[type='submit']").click()
-                time.sleep(5)
+                self.waiter.url_leaves("auth.zaim.net", "login_submit")
             except Exception as e:
                 logging.warning(f"Zaimログインフォームの操作中にエラー（すでにログイン済み等の可能性）: {e}")
 
@@ -107,10 +801,40 @@ class ZaimScraper:
             logging.info("くふうアカウント画面を検知、再ログインします。")
             self._login_kufu_account()
 
-        time.sleep(5)
-        if "money" in self.driver.current_url or "home" in self.driver.current_url:
+        self.waiter.url_contains_any(("money", "home"), "login_landing")
+        if self.is_logged_in():
             logging.info("ログイン成功")
 
+    def is_logged_in(self) -> bool:
+        return "money" in self.driver.current_url or "home" in self.driver.current_url
+
+    def ensure_login(self, cache: Optional[SessionCache] = None):
+        """キャッシュ済みセッションが有効ならフォームログインを省略し、失効していればログインし直す"""
+        with stage_timer.stage("login"):
+            cookies = cache.load() if cache else None
+            if cookies is not None:
+                if self._resume_session(cookies):
+                    logging.info("保存済みセッションが有効なため、ログインを省略しました")
+                    cache.record(hit=True)
+                    return
+                logging.info("保存済みセッションが失効しています。フォームからログインします。")
+                cache.clear()
+                self.driver.delete_all_cookies()
+
+            self.login()
+            if cache and cache.enabled:
+                cache.record(hit=False)
+                if self.is_logged_in():
+                    cache.save(self.export_cookies())
+
+    def _resume_session(self, cookies: list) -> bool:
+        """Cookieを復元し、履歴ページを1回開いてログイン画面へ飛ばされないか確認する"""
+        self.restore_cookies(cookies)
+        self.helper.recur_selenium_get(self.config.URL_HISTORY_BASE)
+        self.waiter.page_loaded("session_check")
+        url = self.driver.current_url
+        return "auth.zaim.net" not in url and "id.kufu.jp" not in url and self.is_logged_in()
+
     def _login_kufu_account(self):
         try:
             try:
@@ -125,252 +849,1049 @@ class ZaimScraper:
             pwd.send_keys(self.config.ZAIM_PASS)
 
             self.driver.find_element(By.CSS_SELECTOR, "button[type='submit'], input[type='submit']").click()
-            time.sleep(5)
+            self.waiter.url_leaves("id.kufu.jp", "kufu_submit")
         except Exception as e:
             logging.error(f"くふうアカウントログインエラー: {e}")
             raise
 
-    def fetch_data_loop(self, months: int = 3) -> Optional[pd.DataFrame]:
-        all_dfs = []
+    def export_cookies(self) -> list:
+        """ログイン済みセッションのCookieを取り出す（他のブラウザセッションへの共有用）"""
+        return self.driver.get_cookies()
+
+    def restore_cookies(self, cookies: list):
+        """Cookieを現在のブラウザへ流し込む。ドメインを合わせるため先にZaimの軽量なページを開く"""
+        self.helper.recur_selenium_get(self.config.URL_COOKIE_ORIGIN)
+        for cookie in cookies:
+            cookie = dict(cookie)
+            if "expiry" in cookie:
+                cookie["expiry"] = int(cookie["expiry"])
+            try:
+                self.driver.add_cookie(cookie)
+            except Exception as e:
+                logging.debug(f"Cookieの復元をスキップ ({cookie.get('name')}): {e}")
+
+    @staticmethod
+    def target_months(months: int) -> list:
+        """今月から遡って months ヶ月分の対象月 (Timestamp) を新しい順に返す"""
         # datetime.date.today() ではなく pd.Timestamp.today() を使用
         # pd.DateOffset は pandas の Timestamp 型との計算に最適化されているため
         today = pd.Timestamp.today()
+        return [today - pd.DateOffset(months=i) for i in range(months)]
 
-        for i in range(months):
-            target_date = today - pd.DateOffset(months=i)
-            month_param = target_date.strftime("%Y%m")
-
-            url = f"{self.config.URL_HISTORY_BASE}?month={month_param}"
-            logging.info(f"[{i+1}/{months}] {target_date.strftime('%Y年%m月')} のデータを取得中... ({url})")
+    @staticmethod
+    def concat_months(monthly_dfs: dict) -> Optional[pd.DataFrame]:
+        if not monthly_dfs:
+            return None
+        return pd.concat(list(monthly_dfs.values()), ignore_index=True)
 
-            df = self._scrape_one_shot(url)
+    def iter_months(self, targets: list):
+        """対象月を順に取得し、取得できた月から ('YYYY-MM', DataFrame) を順次返す（データなしの月は飛ばす）"""
+        for i, target_date in enumerate(targets):
+            logging.info(f"[{i+1}/{len(targets)}] {target_date.strftime('%Y年%m月')} のデータを取得中...")
 
+            df = self._scrape_month(target_date)
             if df is not None and not df.empty:
-                df["ScrapedYear"] = target_date.year
-                all_dfs.append(df)
+                yield target_date.strftime("%Y-%m"), df
             else:
                 logging.info("データなし")
 
-            time.sleep(3)
+            if self.config.REQUEST_INTERVAL > 0:
+                time.sleep(self.config.REQUEST_INTERVAL)
 
-        if not all_dfs:
-            return None
+    def fetch_months(self, targets: list) -> dict:
+        """対象月を順に取得し、{'YYYY-MM': DataFrame} を対象月の順で返す（データなしの月は含めない）"""
+        return dict(self.iter_months(targets))
 
-        return pd.concat(all_dfs, ignore_index=True)
+    def fetch_data_loop(self, months: int = 3) -> Optional[pd.DataFrame]:
+        return self.concat_months(self.fetch_months(self.target_months(months)))
 
-    def _scrape_one_shot(self, url: str) -> Optional[pd.DataFrame]:
-        """[縦長ウィンドウ版] スクロールせずに一括解析する（念のため末尾へ一度移動）"""
-        try:
-            self.helper.recur_selenium_get(url)
+    def _scrape_month(self, target_date: pd.Timestamp) -> Optional[pd.DataFrame]:
+        month_param = target_date.strftime("%Y%m")
+        url = f"{self.config.URL_HISTORY_BASE}?month={month_param}"
+        logging.info(f"  - {url}")
 
-            try:
-                container = self.wait.until(
-                    EC.presence_of_element_located((By.CSS_SELECTOR, "div[class^='SearchResult-module__list']"))
-                )
-                time.sleep(5)  # 描画待ち時間を長めに確保
-            except Exception as e:
-                logging.error(f"リスト要素が見つかりませんでした: {e}")
-                return None
+        df = self._scrape_one_shot(url, target_date.strftime("%Y-%m"))
+        if df is not None and not df.empty:
+            df["ScrapedYear"] = target_date.year
+            df["ScrapedMonth"] = target_date.month
+        return df
 
-            # 念のため、JavaScriptで一番下へ一度だけ飛ばして、遅延ロードの残りを拾う
-            try:
-                self.driver.execute_script("arguments[0].scrollTop = arguments[0].scrollHeight", container)
-                time.sleep(2)
-            except Exception as e:
-                logging.warning(f"強制スクロール実行時にエラー（無視して続行）: {e}")
+    def _scrape_one_shot(self, url: str, month_key: Optional[str] = None) -> Optional[pd.DataFrame]:
+        """一覧を少しずつスクロールし、表示された行をその都度 zaim_id 単位で取り込む"""
+        try:
+            with stage_timer.stage("page_load"):
+                self.helper.recur_selenium_get(url)
 
-            # 解析（画面に見えているもの全てを取得）
-            scraped_data = {}
-            self._parse_current_view(scraped_data)
+                try:
+                    container = self.wait.until(
+                        EC.presence_of_element_located((By.CSS_SELECTOR, "div[class^='SearchResult-module__list']"))
+                    )
+                    self.waiter.dom_quiet(container, "list_render")
+                except Exception as e:
+                    logging.error(f"リスト要素が見つかりませんでした: {e}")
+                    return None
+
+            scraped_data = RowBatch()
+            if self.capture is not None and month_key:
+                # 記録時は各スクロール位置の一覧HTMLを保存し、再生時と同じ結果になるようにそれを解析する
+                snapshots = []
+                self._harvest_by_scroll(container, scraped_data, snapshots)
+                self.capture.save(month_key, f"<html><body>{''.join(snapshots)}</body></html>")
+            else:
+                self._harvest_by_scroll(container, scraped_data)
 
+            self._check_completeness(month_key, len(scraped_data))
             logging.info(f"合計 {len(scraped_data)} 件のデータを抽出完了")
-            return pd.DataFrame(list(scraped_data.values()))
+            return scraped_data.to_frame()
 
         except Exception as e:
             logging.error(f"解析エラー: {e}")
             return None
 
-    def _parse_current_view(self, data_store: dict):
-        """現在のDOMにある行を解析"""
+    # 一覧を内包するスクロール可能な要素 (なければページ全体) を表示高さの8割だけ送り、動いたかを返す
+    _JS_SCROLL = """
+        let scroller = arguments[0];
+        while (scroller && !(/(auto|scroll|overlay)/.test(getComputedStyle(scroller).overflowY)
+                && scroller.scrollHeight > scroller.clientHeight + 1)) {
+            scroller = scroller.parentElement;
+        }
+        if (!scroller) scroller = document.scrollingElement || document.documentElement;
+        const before = scroller.scrollTop;
+        scroller.scrollTop = before + Math.max(Math.floor(scroller.clientHeight * 0.8), 200);
+        return scroller.scrollTop > before;
+    """
+
+    def _harvest_by_scroll(self, container, data_store: RowBatch, snapshots: Optional[list] = None):
+        """取り込み→スクロール を繰り返す。最下部に達するか、新しい行が続けて増えなくなったら終了する"""
+        idle = 0
+        moved = True
+        for _ in range(self.config.SCROLL_MAX_STEPS):
+            before = len(data_store)
+            if snapshots is None:
+                self._parse_current_view(data_store, container)
+            else:
+                html = self._container_html(container)
+                snapshots.append(html)
+                self._parse_html(html, data_store)
+            idle = 0 if len(data_store) > before else idle + 1
+
+            if not moved or idle >= self.config.SCROLL_IDLE_ROUNDS:
+                return
+            with stage_timer.stage("scroll"):
+                moved = self.driver.execute_script(self._JS_SCROLL, container)
+                if moved:
+                    self.waiter.dom_quiet(container, "scroll_render")
+
+        logging.warning(
+            f"スクロール回数の上限 ({self.config.SCROLL_MAX_STEPS}回) に達しました。取得漏れの可能性があります"
+        )
+
+    def _reported_count(self) -> Optional[int]:
+        """Zaimが表示している月の明細件数を読む。表示が見つからない場合は None"""
+        if not self.config.MONTH_COUNT_SELECTOR:
+            return None
+        try:
+            elements = self.driver.find_elements(By.CSS_SELECTOR, self.config.MONTH_COUNT_SELECTOR)
+        except Exception as e:
+            logging.debug(f"件数表示の取得に失敗: {e}")
+            return None
+        for element in elements:
+            count = self._parse_count(element.text)
+            if count is not None:
+                return count
+        return None
+
+    @staticmethod
+    def _parse_count(text: str) -> Optional[int]:
+        """「1,234件」のような件数表示から数値を取り出す"""
+        match = re.search(r"\d[\d,]*", text)
+        return int(match.group().replace(",", "")) if match else None
+
+    def _check_completeness(self, month_key: Optional[str], rows: int):
+        reported = self._reported_count()
+        if month_key:
+            self.completeness[month_key] = {"rows": rows, "reported": reported}
+        if reported is None:
+            logging.debug("件数表示が見つからないため、取得件数の確認をスキップします")
+        elif rows < reported:
+            logging.warning(f"取得件数 ({rows}件) が Zaim の表示件数 ({reported}件) より少なくなっています")
+
+    def _parse_current_view(self, data_store: RowBatch, container=None):
+        """現在のDOMにある行を解析
+
+        container を渡した場合は、page_source の代わりにその要素の outerHTML だけを受け取って解析する
+        (スクロールのたびにページ全体を転送・再解析しないため)。
+        """
         try:
-            soup = BeautifulSoup(self.driver.page_source, "html.parser")
-            rows = soup.find_all("div", class_=re.compile(r"SearchResult-module__body"))
+            if self.config.EXTRACT_MODE == "script":
+                with stage_timer.stage("script_extract") as stage:
+                    stage.rows = self.script_extractor.collect(self.driver, data_store)
+            elif container is not None:
+                self._parse_html(self._container_html(container), data_store)
+            else:
+                self._parse_html(self._page_source(), data_store)
+        except Exception as e:
+            logging.error(f"ビュー全体の解析エラー: {e}")
 
-            for row in rows:
+    def _container_html(self, container) -> str:
+        """一覧の要素の outerHTML だけをブラウザから受け取る（転送量を計測する）"""
+        with stage_timer.stage("page_source") as stage:
+            html = self.driver.execute_script("return arguments[0].outerHTML", container)
+            stage.bytes = len(html.encode("utf-8"))
+        return html
+
+    def _page_source(self) -> str:
+        """ブラウザからHTMLを受け取る（転送量を計測する）"""
+        with stage_timer.stage("page_source") as stage:
+            html = self.driver.page_source
+            stage.bytes = len(html.encode("utf-8"))
+        return html
+
+    def _parse_html(self, html: str, data_store: RowBatch):
+        with stage_timer.stage("parse") as stage:
+            before = len(data_store)
+            self.row_parser.parse(html, data_store)
+            stage.rows = len(data_store) - before
+            stage.bytes = len(html.encode("utf-8"))
+
+
+class ParallelMonthScraper:
+    """月リストを複数のブラウザセッションに分配し、同時実行数を制限して並列に取得する"""
+
+    # プロファイルのコピー時に除外するもの (ロックファイル・キャッシュ類)
+    _PROFILE_IGNORE = shutil.ignore_patterns("lock", ".parentlock", "parent.lock", "cache2", "startupCache")
+
+    def __init__(
+        self,
+        config: Config,
+        cookies: list,
+        waiter: Optional[ReadinessWaiter] = None,
+        completeness: Optional[dict] = None,
+    ):
+        self.config = config
+        self.cookies = cookies
+        # 各セッションの待機記録・取得件数を集約する先（ログイン済みセッションのもの）
+        self.waiter = waiter
+        self.completeness = completeness
+        self.workers = max(1, min(config.SCRAPE_WORKERS, config.MAX_SCRAPE_WORKERS))
+
+    def fetch_months(self, targets: list) -> dict:
+        """fetch_months と同じ形式の結果を返す。月の並びは targets の順に揃えるため結果は決定的"""
+        n = min(self.workers, len(targets))
+        if n == 0:
+            return {}
+
+        # 月をラウンドロビンで分配（直近の月が各セッションに散らばるようにする）
+        shards = [targets[i::n] for i in range(n)]
+        logging.info(f"{len(targets)}ヶ月分を {n} セッションで並列取得します")
+
+        results = {}
+        with ThreadPoolExecutor(max_workers=n, thread_name_prefix="scraper") as executor:
+            futures = [executor.submit(self._run_shard, worker_id, shard) for worker_id, shard in enumerate(shards)]
+            for future in futures:
+                results.update(future.result())
+
+        order = [t.strftime("%Y-%m") for t in targets]
+        return {key: results[key] for key in order if key in results}
+
+    def _run_shard(self, worker_id: int, shard: list) -> dict:
+        profile_copy = self._copy_profile(worker_id)
+        try:
+            with BrowserManager(self.config, headless=True, profile_path=profile_copy) as helper:
+                scraper = ZaimScraper(helper, self.config)
                 try:
-                    zaim_id = ""
-                    link_elm = row.find(attrs={"data-url": True})
-                    if link_elm:
-                        match = re.search(r"/money/(\d+)", link_elm["data-url"])
-                        if match:
-                            zaim_id = match.group(1)
-
-                    if not zaim_id:
-                        continue
-                    if zaim_id in data_store:
-                        continue
+                    scraper.restore_cookies(self.cookies)
+                    return scraper.fetch_months(shard)
+                finally:
+                    if self.waiter is not None:
+                        self.waiter.records.extend(scraper.waiter.records)
+                    if self.completeness is not None:
+                        self.completeness.update(scraper.completeness)
+        except Exception as e:
+            logging.error(f"[worker {worker_id}] 並列取得中にエラー: {e}")
+            return {}
+        finally:
+            if profile_copy:
+                shutil.rmtree(profile_copy, ignore_errors=True)
+
+    def _copy_profile(self, worker_id: int) -> Optional[str]:
+        """Firefoxプロファイルは同時に1プロセスしか使えないため、セッションごとに一時コピーを作る"""
+        if not self.config.FIREFOX_PROFILE_PATH:
+            return None
+        dst = tempfile.mkdtemp(prefix=f"zaim_profile_{worker_id}_")
+        shutil.copytree(self.config.FIREFOX_PROFILE_PATH, dst, ignore=self._PROFILE_IGNORE, dirs_exist_ok=True)
+        return dst
 
-                    date_div = row.find("div", class_=re.compile(r"SearchResult-module__date"))
-                    date_text = date_div.get_text(strip=True) if date_div else ""
 
-                    cat_div = row.find("div", class_=re.compile(r"SearchResult-module__category"))
-                    cat_text = cat_div.get_text(strip=True) if cat_div else ""
+class PageCapture:
+    """取得した月ごとの page_source を gzip 圧縮して保存・読み込みする"""
 
-                    price_div = row.find("div", class_=re.compile(r"SearchResult-module__price"))
-                    price_text = price_div.get_text(strip=True) if price_div else "0"
+    MONTH_PATTERN = re.compile(r"^\d{4}-\d{2}$")
 
-                    from_div = row.find("div", class_=re.compile(r"SearchResult-module__fromAccount"))
-                    from_img = from_div.find("img") if from_div else None
-                    from_text = from_img.get("alt") if from_img else ""
+    def __init__(self, config: Config):
+        self.directory = config.CAPTURE_DIR
 
-                    to_div = row.find("div", class_=re.compile(r"SearchResult-module__toAccount"))
-                    to_img = to_div.find("img") if to_div else None
-                    to_text = to_img.get("alt") if to_img else ""
+    def _path(self, month_key: str) -> str:
+        return os.path.join(self.directory, f"{month_key}.html.gz")
 
-                    place_div = row.find("div", class_=re.compile(r"SearchResult-module__place"))
-                    place_text = place_div.get_text(strip=True) if place_div else ""
+    def save(self, month_key: str, html: str):
+        os.makedirs(self.directory, exist_ok=True)
+        with gzip.open(self._path(month_key), "wt", encoding="utf-8") as f:
+            f.write(html)
+        logging.info(f"ページを記録しました: {self._path(month_key)}")
 
-                    name_div = row.find("div", class_=re.compile(r"SearchResult-module__name"))
-                    name_text = name_div.get_text(strip=True) if name_div else ""
+    def load(self, month_key: str) -> Optional[str]:
+        path = self._path(month_key)
+        if not os.path.exists(path):
+            return None
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            return f.read()
+
+    def available_months(self) -> list:
+        """記録済みの月を新しい順に返す"""
+        names = (os.path.basename(p)[: -len(".html.gz")] for p in glob.glob(self._path("*")))
+        return sorted((n for n in names if self.MONTH_PATTERN.match(n)), reverse=True)
 
-                    data_store[zaim_id] = {
-                        "zaim_id": zaim_id,
-                        "日付": date_text,
-                        "カテゴリ": cat_text,
-                        "金額": price_text,
-                        "出金元": from_text,
-                        "入金先": to_text,
-                        "お店": place_text,
-                        "品名": name_text,
-                    }
-                except Exception as e:
-                    logging.error(f"行データの解析エラー: {e}")
-                    continue
-        except Exception as e:
-            logging.error(f"ビュー全体の解析エラー: {e}")
 
+class ReplayScraper(ZaimScraper):
+    """記録済みページから月ごとのデータを再生する（Firefox・Zaimへのログインが不要）"""
+
+    def __init__(self, config: Config):
+        self.helper = None
+        self.driver = None
+        self.config = config
+        self.waiter = ReadinessWaiter(None, config)
+        self.row_parser = create_row_parser(config.PARSER_BACKEND)
+        self.capture = PageCapture(config)
+        self.completeness: dict = {}
+
+    def ensure_login(self, cache: Optional[SessionCache] = None):
+        logging.info(f"リプレイモード: {self.capture.directory} の記録を使用します（ログイン省略）")
+
+    def target_months(self, months: int) -> list:
+        """今日の日付ではなく、記録済みの月から新しい順に months ヶ月分を対象にする"""
+        return [pd.Timestamp(f"{key}-01") for key in self.capture.available_months()[:months]]
+
+    def _scrape_one_shot(self, url: str, month_key: Optional[str] = None) -> Optional[pd.DataFrame]:
+        html = self.capture.load(month_key) if month_key else None
+        if html is None:
+            logging.warning(f"記録済みページがありません: {month_key}")
+            return None
+
+        scraped_data = RowBatch()
+        self._parse_html(html, scraped_data)
+        logging.info(f"合計 {len(scraped_data)} 件のデータを抽出完了 (リプレイ)")
+        return scraped_data.to_frame()
+
+
+class HistoryJsonDecoder:
+    """履歴画面が呼び出す JSON API の応答を、RowBatch の行タプル (RowBatch.COLUMNS の順) にする
+
+    明細の配列 (トップレベル、または money / items / data などの下) の各要素から項目を取り出す。
+    名前が入れ子になった形式 ({"category": {"name": "食費"}}) と、*_name の形式の両方を受け付ける。
+    """
+
+    LIST_KEYS = ("money", "moneys", "items", "data", "results", "list")
+    ID_KEYS = ("id", "money_id", "zaim_id")
+    CATEGORY_KEYS = ("category_name", "category")
+    GENRE_KEYS = ("genre_name", "genre")
+    FROM_ACCOUNT_KEYS = ("from_account_name", "from_account")
+    TO_ACCOUNT_KEYS = ("to_account_name", "to_account")
+    DATE_PATTERN = re.compile(r"^\d{4}-(\d{1,2})-(\d{1,2})")
+
+    @classmethod
+    def records(cls, payload) -> list:
+        """応答から明細の配列を探して返す（見つからなければ空リスト）"""
+        if isinstance(payload, list):
+            return [item for item in payload if isinstance(item, dict)]
+        if isinstance(payload, dict):
+            for key in cls.LIST_KEYS:
+                if key in payload:
+                    found = cls.records(payload[key])
+                    if found:
+                        return found
+        return []
 
-# --- 4. データ加工クラス ---
-class DataProcessor:
     @staticmethod
-    def process(df: pd.DataFrame) -> pd.DataFrame:
-        logging.info("データを加工・結合中...")
-        df_clean = df.copy()
+    def _name(record: dict, keys: tuple) -> str:
+        for key in keys:
+            value = record.get(key)
+            if isinstance(value, dict):
+                value = value.get("name")
+            if value not in (None, "") and not isinstance(value, (dict, list)):
+                return str(value)
+        return ""
+
+    @classmethod
+    def to_row(cls, record: dict) -> Optional[tuple]:
+        zaim_id = cls._name(record, cls.ID_KEYS)
+        if not zaim_id.isdigit():
+            return None
 
-        # 日付処理
-        if "日付" in df_clean.columns:
+        # 日付は履歴ページと同じ「10月5日」の形にそろえる（年は ScrapedYear から補う）
+        match = cls.DATE_PATTERN.match(cls._name(record, ("date",)))
+        date = f"{int(match.group(1))}月{int(match.group(2))}日" if match else ""
+        try:
+            amount = str(int(float(record.get("amount") or 0)))
+        except (TypeError, ValueError):
+            amount = "0"
+
+        return (
+            zaim_id,
+            date,
+            cls._name(record, cls.CATEGORY_KEYS) + cls._name(record, cls.GENRE_KEYS),
+            amount,
+            cls._name(record, cls.FROM_ACCOUNT_KEYS),
+            cls._name(record, cls.TO_ACCOUNT_KEYS),
+            cls._name(record, ("place",)),
+            cls._name(record, ("name", "comment")),
+        )
+
+    @classmethod
+    def decode(cls, text: str, data_store: RowBatch) -> int:
+        """JSON を解析し、未登録の zaim_id の行を data_store に追加して、追加した件数を返す"""
+        with stage_timer.stage("parse") as stage:
+            added = 0
+            for record in cls.records(json.loads(text)):
+                row = cls.to_row(record)
+                if row and data_store.add(row):
+                    added += 1
+            stage.rows = added
+            stage.bytes = len(text.encode("utf-8"))
+        return added
+
+
+class HttpHistoryClient:
+    """ログイン済みセッションのCookieを使い、履歴ページを接続プール付きのHTTPで直接取得する"""
+
+    LOGIN_HOSTS = ("auth.zaim.net", "id.kufu.jp")
+
+    def __init__(self, config: Config):
+        self.config = config
+        self.session = requests.Session()
+        retry = Retry(total=2, backoff_factor=0.5, status_forcelist=(429, 500, 502, 503, 504), allowed_methods=("GET",))
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=config.HTTP_POOL_SIZE, max_retries=retry)
+        self.session.mount("https://", adapter)
+        self.session.headers["User-Agent"] = config.HTTP_USER_AGENT
+
+    def set_cookies(self, cookies: list):
+        """Selenium形式 (get_cookies) のCookieをセッションに入れる"""
+        for cookie in cookies:
+            self.session.cookies.set(
+                cookie["name"], cookie["value"], domain=cookie.get("domain", ""), path=cookie.get("path", "/")
+            )
+
+    def export_cookies(self) -> list:
+        """セッションのCookieを Selenium形式 (add_cookie) で返す"""
+        cookies = []
+        for c in self.session.cookies:
+            cookie = {"name": c.name, "value": c.value, "domain": c.domain, "path": c.path, "secure": c.secure}
+            if c.expires:
+                cookie["expiry"] = c.expires
+            cookies.append(cookie)
+        return cookies
+
+    def fetch(self, url: str) -> Optional[str]:
+        """ページのHTMLを返す。ログイン画面へ転送された場合・取得に失敗した場合は None"""
+        page = self.fetch_page(url)
+        return page[1] if page else None
+
+    def fetch_page(self, url: str) -> Optional[tuple]:
+        """(Content-Type, 本文) を返す。ログイン画面へ転送された場合・取得に失敗した場合は None"""
+        with stage_timer.stage("http_fetch") as stage:
+            try:
+                response = self.session.get(url, timeout=self.config.WAIT_TIMEOUT)
+            except requests.RequestException as e:
+                logging.warning(f"HTTP取得に失敗しました: {e}")
+                return None
+            stage.bytes = len(response.content)
+
+        if any(host in response.url for host in self.LOGIN_HOSTS):
+            logging.info("HTTP取得: セッションが無効です（ログイン画面へ転送されました）")
+            return None
+        if response.status_code != 200:
+            logging.warning(f"HTTP取得: ステータス {response.status_code} ({url})")
+            return None
+        # charset 未指定の text/html は ISO-8859-1 扱いになるため、Zaimの文字コードに合わせる
+        if not response.encoding or response.encoding.lower() == "iso-8859-1":
+            response.encoding = "utf-8"
+        return response.headers.get("Content-Type", ""), response.text
+
+    def is_authenticated(self) -> bool:
+        return self.fetch(self.config.URL_HISTORY_BASE) is not None
+
+
+class HttpScraper(ZaimScraper):
+    """明細ページをHTTPで取得する。ブラウザはログインと、HTTPで明細が取れなかった月のためだけに起動する"""
+
+    def __init__(self, config: Config, stack: ExitStack):
+        self.helper = None
+        self.driver = None
+        self.config = config
+        self.waiter = ReadinessWaiter(None, config)
+        self.row_parser = create_row_parser(config.PARSER_BACKEND)
+        self.capture = PageCapture(config) if config.CAPTURE_MODE == "record" else None
+        self.client = HttpHistoryClient(config)
+        self.completeness: dict = {}
+        # ブラウザは必要になった時点で stack の中で起動する（main の終了時に閉じる）
+        self._stack = stack
+        self._browser_scraper: Optional[ZaimScraper] = None
+
+    def _browser(self) -> ZaimScraper:
+        if self._browser_scraper is None:
+            helper = self._stack.enter_context(BrowserManager(self.config, headless=True))
+            self._browser_scraper = ZaimScraper(helper, self.config)
+            self._browser_scraper.waiter.records = self.waiter.records
+            self._browser_scraper.completeness = self.completeness
+        return self._browser_scraper
+
+    def ensure_login(self, cache: Optional[SessionCache] = None):
+        """保存済みセッションがHTTPで有効ならブラウザを起動しない。無効ならブラウザでログインしてCookieを引き継ぐ"""
+        cookies = cache.load() if cache else None
+        if cookies is not None:
+            self.client.set_cookies(cookies)
+            if self.client.is_authenticated():
+                logging.info("保存済みセッションが有効なため、ブラウザを起動せずにHTTPで取得します")
+                cache.record(hit=True)
+                return
+            logging.info("保存済みセッションが失効しています。ブラウザでログインします。")
+            cache.clear()
+            self.client.session.cookies.clear()
+
+        browser = self._browser()
+        browser.ensure_login(cache)
+        self.client.set_cookies(browser.export_cookies())
+
+    def export_cookies(self) -> list:
+        return self.client.export_cookies()
+
+    def restore_cookies(self, cookies: list):
+        self.client.set_cookies(cookies)
+
+    # {page} を含む HTTP_HISTORY_URL で読みに行くページ数の上限
+    MAX_PAGES = 100
 
-            def parse_date(row):
+    @staticmethod
+    def _is_json(content_type: str, text: str) -> bool:
+        head = text.lstrip()[:1]
+        return "json" in content_type.lower() or (head != "" and head in "{[")
+
+    def _fetch_http(self, url: str, month_key: Optional[str]) -> Optional[RowBatch]:
+        """HTTPで月の明細を取る。HTTPでは判断できない (ブラウザで取り直すべき) 場合は None
+
+        JSON の応答は、行が0件でも「明細のない月」として扱う。HTML で行が0件の場合は、ページの件数表示
+        (MONTH_COUNT_SELECTOR) が0件のときだけ明細のない月とし、それ以外 (一覧の枠だけがあって行は
+        クライアント側で描画されるページ等) は None を返す。
+        """
+        month = month_key.replace("-", "") if month_key else ""
+        paged = "{page}" in url
+        scraped_data = RowBatch()
+        for page_number in range(1, self.MAX_PAGES + 1 if paged else 2):
+            page = self.client.fetch_page(url.format(month=month, page=page_number))
+            if page is None:
+                return None
+            content_type, text = page
+
+            if self._is_json(content_type, text):
                 try:
-                    text = str(row["日付"])
-                    # 「（祝）」「（振替休日）」など任意長の括弧内文字列にも対応
-                    text = re.sub(r"（[^）]+）", "", text).strip()
-                    text = text.replace("(", "").replace(")", "")
-
-                    return pd.to_datetime(f"{row['ScrapedYear']}年{text}", format="%Y年%m月%d日", errors="coerce")
-                except Exception:
-                    return pd.NaT
-
-            df_clean["date_obj"] = df_clean.apply(parse_date, axis=1)
-            df_clean["Year"] = df_clean["date_obj"].dt.year
-            df_clean["Month"] = df_clean["date_obj"].dt.month
-            df_clean["YearMonth"] = df_clean["date_obj"].dt.strftime("%Y-%m")
-            df_clean["date_obj"] = df_clean["date_obj"].dt.strftime("%Y-%m-%d")
-
-        # カテゴリのクリーニング
-        if "カテゴリ" in df_clean.columns:
-
-            def clean_cat(text):
-                jp_match = re.search(r"[^\x00-\x7F]+", text)
-                if jp_match:
-                    return text[jp_match.start() :]
-                return text
-
-            df_clean["カテゴリ"] = df_clean["カテゴリ"].apply(clean_cat)
-
-        # 金額処理
-        if "金額" in df_clean.columns:
-            df_clean["金額"] = df_clean["金額"].astype(str).str.replace("¥", "").str.replace(",", "")
-            df_clean["金額"] = pd.to_numeric(df_clean["金額"], errors="coerce").fillna(0)
-
-        # 出金と入金ロジックの整理
-        # 入金先がある場合は「入金」列、出金元がある場合は「出金」列に金額を入れる
-        df_clean["入金"] = 0
-        df_clean["出金"] = 0
-
-        # '入金先' カラムが存在し、かつ値が入っている(NaNでも空文字でもない)場合は「入金」扱い
-        # それ以外は「出金」扱いとする
-        if "入金先" in df_clean.columns:
-            mask_income = df_clean["入金先"].notna() & (df_clean["入金先"] != "")
-
-            # 入金フラグがTrueの行は、金額を「入金」列へコピー
-            df_clean.loc[mask_income, "入金"] = df_clean.loc[mask_income, "金額"]
-
-            # 入金フラグがFalseの行は、金額を「出金」列へコピー
-            df_clean.loc[~mask_income, "出金"] = df_clean.loc[~mask_income, "金額"]
-        else:
-            # 入金先カラムがない場合は全て出金扱い（安全策）
-            df_clean["出金"] = df_clean["金額"]
+                    added = HistoryJsonDecoder.decode(text, scraped_data)
+                except ValueError as e:
+                    logging.warning(f"HTTP取得: JSONを解析できませんでした: {e}")
+                    return None
+            else:
+                before = len(scraped_data)
+                self._parse_html(text, scraped_data)
+                added = len(scraped_data) - before
+                if not added and page_number == 1 and self._reported_count_in(text) != 0:
+                    return None
+                if page_number == 1 and self.capture is not None and month_key:
+                    self.capture.save(month_key, text)
+
+            # ページ送りは、新しい行が増えなくなったら終わり
+            if not added:
+                break
+        return scraped_data
+
+    def _reported_count_in(self, html: str) -> Optional[int]:
+        """HTML の件数表示 (MONTH_COUNT_SELECTOR) を読む。表示が無い場合は None"""
+        if not self.config.MONTH_COUNT_SELECTOR:
+            return None
+        for element in BeautifulSoup(html, "html.parser").select(self.config.MONTH_COUNT_SELECTOR):
+            count = self._parse_count(element.get_text())
+            if count is not None:
+                return count
+        return None
+
+    def _scrape_one_shot(self, url: str, month_key: Optional[str] = None) -> Optional[pd.DataFrame]:
+        http_url = self.config.HTTP_HISTORY_URL if self.config.HTTP_HISTORY_URL and month_key else url
+        scraped_data = self._fetch_http(http_url, month_key)
+        if scraped_data is not None:
+            logging.info(f"合計 {len(scraped_data)} 件のデータを抽出完了 (HTTP)")
+            return scraped_data.to_frame()
+
+        # 明細がクライアント側で描画される場合など、HTTPで判断できなかった月はブラウザで取得する
+        logging.info("HTTPで明細を取得できなかったため、ブラウザで取得します")
+        browser = self._browser()
+        if not browser.is_logged_in():
+            browser.restore_cookies(self.client.export_cookies())
+        return browser._scrape_one_shot(url, month_key)
+
 
-        return df_clean.fillna("")
+# --- 6. 差分同期クラス ---
+class SyncState:
+    """YearMonth ごとに、同期済みの zaim_id 集合と明細内容のフィンガープリントを記録する"""
+
+    FINGERPRINT_COLUMNS = ["zaim_id", "日付", "カテゴリ", "金額", "出金元", "入金先", "お店", "品名"]
+
+    def __init__(self, config: Config):
+        self.config = config
+        self.path = config.SYNC_STATE_PATH
+        self.months: dict = self._load()
+        # アップロード成功後に commit() で反映する分
+        self._pending: dict = {}
+        # DRY_RUN・リプレイはシートの実データを更新しないため、同期状態を読むだけで保存しない
+        # (保存すると、後の通常実行でその月が「変更なし」として本物のシートへ反映されなくなる)
+        self.read_only = config.DRY_RUN or config.CAPTURE_MODE == "replay"
+
+    def _load(self) -> dict:
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logging.warning(f"同期状態を読み込めませんでした（全月を再取得します）: {e}")
+            return {}
+
+    def select_months(self, targets: list) -> list:
+        """再取得が必要な月だけを返す。直近の月と、まだ同期したことのない月が対象"""
+        today = pd.Timestamp.today()
+        hot = {(today - pd.DateOffset(months=i)).strftime("%Y-%m") for i in range(self.config.INCREMENTAL_HOT_MONTHS)}
+
+        selected = [t for t in targets if t.strftime("%Y-%m") in hot or t.strftime("%Y-%m") not in self.months]
+        skipped = len(targets) - len(selected)
+        if skipped:
+            logging.info(f"差分同期: 同期済みの {skipped}ヶ月分の取得をスキップします")
+        return selected
+
+    @classmethod
+    def fingerprint(cls, df: pd.DataFrame) -> str:
+        """行の並び順に依存しない、月の明細内容のハッシュ"""
+        cols = [c for c in cls.FINGERPRINT_COLUMNS if c in df.columns]
+        rows = sorted(df[cols].astype(str).itertuples(index=False, name=None))
+        return hashlib.sha256(json.dumps(rows, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+    def filter_changed(self, monthly_dfs: dict) -> dict:
+        """前回同期時から内容が変わった月だけを返す"""
+        changed = {}
+        for key, df in monthly_dfs.items():
+            fingerprint = self.fingerprint(df)
+            previous = self.months.get(key)
+            if previous and previous["fingerprint"] == fingerprint:
+                logging.info(f"差分同期: {key} は変更なし")
+                continue
+
+            ids = sorted(df["zaim_id"].astype(str).unique().tolist())
+            new_ids = set(ids) - set(previous["ids"]) if previous else set(ids)
+            logging.info(f"差分同期: {key} に変更あり (新規 {len(new_ids)}件 / 全 {len(ids)}件)")
+
+            changed[key] = df
+            self._pending[key] = {
+                "ids": ids,
+                "fingerprint": fingerprint,
+                "synced_at": datetime.now().isoformat(timespec="seconds"),
+            }
+        return changed
+
+    def commit(self):
+        if not self._pending:
+            return
+        if self.read_only:
+            logging.info(f"差分同期: DRY_RUN/リプレイのため同期状態は保存しません ({len(self._pending)}ヶ月分)")
+            self._pending = {}
+            return
+        self.months.update(self._pending)
+        self._pending = {}
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.months, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, self.path)
+
+
+# --- 7. SheetUploader クラス ---
+@dataclass
+class RowMerge:
+    """zaim_id をキーに、新しい行を既存シートの行と突き合わせた結果"""
+
+    headers: list
+    # zaim_id -> 既存データ内の位置 (ヘッダーを除いた0始まり)。重複時は最後の行
+    position: dict
+    # 既存データ内の位置 -> 更新後の行
+    updates: dict
+    appends: list
+    unchanged: int = 0
+
+    def apply(self, existing_records: list) -> list:
+        """既存の行に更新を反映し、追加行を末尾に足した全行を返す（zaim_id が空・重複の行は除く）"""
+        id_col = self.headers.index("zaim_id")
+        width = len(self.headers)
+        rows = []
+        for index, row in enumerate(existing_records[1:]):
+            zaim_id = row[id_col] if len(row) > id_col else ""
+            if not zaim_id or self.position[zaim_id] != index:
+                continue
+            rows.append(self.updates.get(index) or row + [""] * (width - len(row)))
+        return rows + self.appends
+
+
+# Sheets API の再試行対象 (クォータ超過と一時的なサーバーエラー)
+SHEET_RETRY_STATUSES = (429, 500, 502, 503, 504)
+SHEET_RETRY_MAX_DELAY = 64.0
+
+
+def call_sheets_api(config: Config, description: str, func, *args, **kwargs):
+    """Sheets API を呼び出し、429・5xx のときは指数バックオフ (Retry-After があればそれに従う) で再試行する"""
+    for attempt in range(config.SHEET_RETRY_MAX + 1):
+        try:
+            return func(*args, **kwargs)
+        except gspread.exceptions.APIError as e:
+            response = getattr(e, "response", None)
+            status = getattr(response, "status_code", None)
+            if status not in SHEET_RETRY_STATUSES or attempt >= config.SHEET_RETRY_MAX:
+                raise
+            retry_after = (response.headers or {}).get("Retry-After", "")
+            if retry_after.isdigit():
+                wait = float(retry_after)
+            else:
+                wait = config.SHEET_RETRY_BASE_DELAY * 2**attempt * random.uniform(1.0, 1.5)
+            wait = min(wait, SHEET_RETRY_MAX_DELAY)
+            logging.warning(
+                f"{description}: Sheets API がエラー {status} を返しました。"
+                f"{wait:.1f}秒後に再試行します ({attempt + 1}/{config.SHEET_RETRY_MAX})"
+            )
+            time.sleep(wait)
+
+
+class SheetWriteBatch:
+    """複数シートへの書き込みをためておき、まとめて送る
+
+    シートの作成・書式設定は1回の spreadsheets.batchUpdate、値のクリアと書き込みは
+    values.batchClear / values.batchUpdate (RAW) でそれぞれ1回にまとめる。並べ替えは値の書き込み後に
+    もう1回の batchUpdate で行う。シートは sheetId で指定するため、同じバッチ内で作成したシートにも書き込める。
+    """
+
+    def __init__(self, uploader: "SheetUploader"):
+        self.uploader = uploader
+        # 値を書く前に送る batchUpdate (シート作成・グリッド・書式)
+        self.requests: list = []
+        self.clear_ranges: list = []
+        self.value_ranges: list = []
+        # 値を書いた後に送る batchUpdate (並べ替え)
+        self.post_requests: list = []
+        # このバッチで作成するシート: タイトル -> sheetId
+        self._new_sheets: dict = {}
+
+    def sheet_id(self, title: str, rows: int = 100, cols: int = 20) -> int:
+        """シートの sheetId を返す。無ければ作成リクエストを積み、こちらで決めた sheetId を返す"""
+        worksheets = self.uploader.worksheets()
+        if title in worksheets:
+            return worksheets[title].id
+        if title not in self._new_sheets:
+            used = {ws.id for ws in worksheets.values()} | set(self._new_sheets.values())
+            sheet_id = random.randrange(1, 2**31 - 1)
+            while sheet_id in used:
+                sheet_id = random.randrange(1, 2**31 - 1)
+            self.requests.append(
+                {
+                    "addSheet": {
+                        "properties": {
+                            "sheetId": sheet_id,
+                            "title": title,
+                            "gridProperties": {"rowCount": max(rows, 100), "columnCount": max(cols, 20)},
+                        }
+                    }
+                }
+            )
+            self._new_sheets[title] = sheet_id
+        return self._new_sheets[title]
+
+    @staticmethod
+    def a1(title: str, cell: str = "") -> str:
+        quoted = "'" + title.replace("'", "''") + "'"
+        return f"{quoted}!{cell}" if cell else quoted
+
+    def replace_values(self, title: str, values: list):
+        """シートの値をすべて消して values (1行目はヘッダー) を書き、ヘッダー行を太字・固定にする"""
+        sheet_id = self.sheet_id(title, len(values), len(values[0]) if values else 1)
+
+        self.requests += [
+            {
+                "updateSheetProperties": {
+                    "properties": {"sheetId": sheet_id, "gridProperties": {"frozenRowCount": 1}},
+                    "fields": "gridProperties.frozenRowCount",
+                }
+            },
+            {
+                "repeatCell": {
+                    "range": {"sheetId": sheet_id, "startRowIndex": 0, "endRowIndex": 1},
+                    "cell": {"userEnteredFormat": {"textFormat": {"bold": True}}},
+                    "fields": "userEnteredFormat.textFormat.bold",
+                }
+            },
+        ]
+        self.clear_ranges.append(self.a1(title))
+        self.value_ranges.append({"range": self.a1(title, "A1"), "values": values})
+
+    def update_rows(self, title: str, rows: dict):
+        """{データ行の位置 (ヘッダーを除いた0始まり): 行} をその位置に上書きする"""
+        self.value_ranges += [
+            {"range": self.a1(title, f"A{index + 2}"), "values": [values]} for index, values in sorted(rows.items())
+        ]
+
+    def append_rows(self, title: str, rows: list, data_rows: int):
+        """データ行が data_rows 件あるシートの末尾に行を足す（値の書き込みで足りない行は自動で増える）"""
+        if not rows:
+            return
+        self.value_ranges.append({"range": self.a1(title, f"A{data_rows + 2}"), "values": rows})
+
+    def sort_rows(self, title: str, column: int, descending: bool = True):
+        """ヘッダーを除いた全行を column 列 (0始まり) で並べ替える（値の書き込み後に行う）"""
+        self.post_requests.append(
+            {
+                "sortRange": {
+                    "range": {"sheetId": self.sheet_id(title), "startRowIndex": 1},
+                    "sortSpecs": [{"dimensionIndex": column, "sortOrder": "DESCENDING" if descending else "ASCENDING"}],
+                }
+            }
+        )
+
+    def flush(self):
+        """ためた操作を 構造・書式 → 値のクリア → 値の書き込み → 並べ替え の順に送る"""
+        config = self.uploader.config
+        spreadsheet = self.uploader.spreadsheet()
+        calls = 0
+        if self.requests:
+            call_sheets_api(config, "batchUpdate", spreadsheet.batch_update, {"requests": self.requests})
+            calls += 1
+        if self.clear_ranges:
+            call_sheets_api(config, "値のクリア", spreadsheet.values_batch_clear, body={"ranges": self.clear_ranges})
+            calls += 1
+        if self.value_ranges:
+            call_sheets_api(
+                config,
+                "値の書き込み",
+                spreadsheet.values_batch_update,
+                {"valueInputOption": "RAW", "data": self.value_ranges},
+            )
+            calls += 1
+        if self.post_requests:
+            call_sheets_api(config, "並べ替え", spreadsheet.batch_update, {"requests": self.post_requests})
+            calls += 1
+
+        if calls:
+            logging.info(
+                f"シートへの書き込みを送信しました (API呼び出し {calls}回, 範囲 {len(self.value_ranges)}件, "
+                f"構造・書式 {len(self.requests)}件)"
+            )
+        # 作成したシートのハンドルは、次に使う時に取り直す
+        if self._new_sheets:
+            self.uploader.forget_worksheets()
+        self.requests, self.clear_ranges, self.value_ranges, self.post_requests = [], [], [], []
+        self._new_sheets = {}
 
 
-# --- 5. SheetUploader クラス ---
 class SheetUploader:
     def __init__(self, config: Config):
         self.config = config
         self.scope = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
         self.creds = ServiceAccountCredentials.from_json_keyfile_name(self.config.JSON_KEYFILE, self.scope)
         self.client = gspread.authorize(self.creds)
+        # prefetch() で先読みした (シート, 既存データ)。次の upload で1回だけ使う
+        self._prefetched: Optional[tuple] = None
+        # スプレッドシートは1回だけ開き、シートのハンドルはタイトルごとに使い回す
+        self._spreadsheet = None
+        self._worksheets: Optional[dict] = None
+        # batched() の中でためている書き込み
+        self._batch: Optional[SheetWriteBatch] = None
+
+    def spreadsheet(self):
+        if self._spreadsheet is None:
+            self._spreadsheet = call_sheets_api(
+                self.config, "スプレッドシートを開く", self.client.open_by_key, self.config.SPREADSHEET_KEY
+            )
+        return self._spreadsheet
+
+    def worksheets(self) -> dict:
+        """タイトル -> シートのハンドル (シートの並び順)"""
+        if self._worksheets is None:
+            spreadsheet = self.spreadsheet()
+            self._worksheets = {
+                ws.title: ws for ws in call_sheets_api(self.config, "シート一覧", spreadsheet.worksheets)
+            }
+        return self._worksheets
+
+    def ledger_sheet(self):
+        """明細を書き込む先頭のシート"""
+        return next(iter(self.worksheets().values()))
+
+    def forget_worksheets(self):
+        self._worksheets = None
+
+    def forget_spreadsheet(self):
+        """エラー後などに、次回はスプレッドシートを開き直す"""
+        self._spreadsheet = None
+        self._worksheets = None
+
+    @contextmanager
+    def batched(self):
+        """ブロック内の書き込み (upload / upload_insight / upload_insights) をため、抜ける時にまとめて送る
+
+        入れ子にした場合は一番外側で送る。ブロック内で例外が起きた場合は何も送らない。
+        """
+        if self._batch is not None:
+            yield self._batch
+            return
+        self._batch = SheetWriteBatch(self)
+        try:
+            yield self._batch
+            self._batch.flush()
+        finally:
+            self._batch = None
 
-    def upload(self, df_new: pd.DataFrame):
+    def prefetch(self):
+        """ブラウザ操作と並行して、シートを開き既存データを先読みしておく"""
+        try:
+            sheet = self.ledger_sheet()
+            records = call_sheets_api(self.config, "既存データの読み込み", sheet.get_all_values)
+            self._prefetched = (sheet, records)
+            logging.info(f"既存シートを先読みしました ({max(len(records) - 1, 0)}件)")
+        except Exception as e:
+            logging.warning(f"既存シートの先読みに失敗しました（アップロード時に読み直します）: {e}")
+
+    def upload(self, df_new: pd.DataFrame) -> bool:
         logging.info("スプレッドシートへ安全にアップロード中（重複チェック）...")
         try:
-            sheet = self.client.open_by_key(self.config.SPREADSHEET_KEY).sheet1
+            # 1. 既存データを全取得 (先読み済みならそれを使う)
+            prefetched, self._prefetched = self._prefetched, None
+            if prefetched:
+                sheet, existing_records = prefetched
+            else:
+                sheet = self.ledger_sheet()
+                existing_records = call_sheets_api(self.config, "既存データの読み込み", sheet.get_all_values)
 
-            # 1. 既存データを全取得
-            existing_records = sheet.get_all_values()
+            if existing_records and self.config.UPLOAD_MODE == "delta":
+                written = self._upload_delta(sheet, existing_records, df_new)
+                if written is not None:
+                    return written
 
             if existing_records:
-                # ヘッダーとデータに分離
-                headers = existing_records[0]
-                df_old = pd.DataFrame(existing_records[1:], columns=headers)
-
-                # 型合わせ
-                df_new["zaim_id"] = df_new["zaim_id"].astype(str)
-                if "zaim_id" in df_old.columns:
-                    df_old["zaim_id"] = df_old["zaim_id"].astype(str)
-
-                logging.info(f"既存データ: {len(df_old)}件, 新規データ: {len(df_new)}件")
-
-                # 2. 結合
-                df_combined = pd.concat([df_old, df_new], ignore_index=True)
-
-                # 3. 重複排除
-                if "zaim_id" in df_combined.columns:
-                    df_combined = df_combined[df_combined["zaim_id"] != ""]
-                    df_final = df_combined.drop_duplicates(subset=["zaim_id"], keep="last").copy()
-                else:
-                    df_final = df_combined.copy()
-
-                logging.info(f"重複排除後の件数: {len(df_final)}件")
+                # 2. 既存データの zaim_id 索引に対して、新しい行を更新・追加する（重複排除）
+                logging.info(f"既存データ: {len(existing_records) - 1}件, 新規データ: {len(df_new)}件")
+                merge = self._merge_by_id(existing_records, df_new)
+                logging.info(
+                    f"突き合わせ結果: 新規 {len(merge.appends)}件, 更新 {len(merge.updates)}件, 変更なし {merge.unchanged}件"
+                )
+                headers, rows = merge.headers, merge.apply(existing_records)
+                logging.info(f"重複排除後の件数: {len(rows)}件")
             else:
-                df_final = df_new.copy()
+                headers, rows = df_new.columns.tolist(), df_new.values.tolist()
 
-            # 4. 日付順にソート
-            if "date_obj" in df_final.columns:
-                df_final["date_obj"] = pd.to_datetime(df_final["date_obj"], errors="coerce")
-                df_final = df_final.sort_values(by="date_obj", ascending=False)
-                df_final["date_obj"] = df_final["date_obj"].dt.strftime("%Y-%m-%d")
+            # 3. 日付順にソート
+            rows = self._sort_by_date(headers, rows)
 
-            # 5. 書き込み
-            sheet.clear()
-            sheet.update([df_final.columns.values.tolist()] + df_final.values.tolist())
+            # 4. 書き込み (書式は batchUpdate、値はクリアと書き込みをそれぞれ1回で送る)
+            with self.batched() as batch:
+                batch.replace_values(sheet.title, [headers] + rows)
             logging.info("アップロード完了")
+            return True
 
         except Exception as e:
             logging.error(f"アップロードエラー: {e}")
             logging.error(traceback.format_exc())
+            self.forget_spreadsheet()
+            return False
+
+    @staticmethod
+    def _normalize_cell(value) -> str:
+        """シート上の文字列 ("1,200") と DataFrame の値 (1200) を同じ基準で比較するための正規化"""
+        text = str(value).replace(",", "")
+        try:
+            return repr(float(text))
+        except ValueError:
+            return text
+
+    def _merge_by_id(self, existing_records: list, df_new: pd.DataFrame) -> RowMerge:
+        """既存データの zaim_id→行位置 の索引を作り、新しい行を 更新 / 追加 / 変更なし に振り分ける
+
+        処理量は新しい行の数に比例する（既存データ全体の結合・重複排除は行わない）。
+        新しいデータに無い列は、既存行の値を残す。
+        """
+        headers = list(existing_records[0])
+        headers += [col for col in df_new.columns if col not in headers]
+        id_col = headers.index("zaim_id")
+        width = len(headers)
+        position = {row[id_col]: i for i, row in enumerate(existing_records[1:]) if len(row) > id_col}
+        position.pop("", None)
+
+        df_new = df_new.copy()
+        df_new["zaim_id"] = df_new["zaim_id"].astype(str)
+        df_new = df_new[df_new["zaim_id"] != ""].drop_duplicates(subset=["zaim_id"], keep="last")
+        new_columns = set(df_new.columns)
+
+        merge = RowMerge(headers, position, {}, [])
+        for values in df_new.reindex(columns=headers, fill_value="").values.tolist():
+            index = position.get(values[id_col])
+            if index is None:
+                merge.appends.append(values)
+                continue
+
+            old = existing_records[index + 1]
+            old = old + [""] * (width - len(old))
+            values = [v if col in new_columns else old[i] for i, (col, v) in enumerate(zip(headers, values))]
+            if [self._normalize_cell(v) for v in values] != [self._normalize_cell(v) for v in old]:
+                merge.updates[index] = values
+            else:
+                merge.unchanged += 1
+        return merge
+
+    @staticmethod
+    def _sort_by_date(headers: list, rows: list) -> list:
+        """date_obj の降順に並べ替え、日付を YYYY-MM-DD にそろえる（日付として読めない行は末尾）"""
+        if "date_obj" not in headers or not rows:
+            return rows
+        col = headers.index("date_obj")
+        dates = pd.to_datetime(pd.Series([row[col] for row in rows], dtype=object), errors="coerce")
+        formatted = dates.dt.strftime("%Y-%m-%d").fillna("").tolist()
+        for row, value in zip(rows, formatted):
+            row[col] = value
+        order = dates.sort_values(ascending=False, kind="stable", na_position="last").index
+        return [rows[i] for i in order]
+
+    def _upload_delta(self, sheet, existing_records: list, df_new: pd.DataFrame) -> Optional[bool]:
+        """新規・変更のあった行だけを書き込む。ヘッダーが合わず差分書き込みできない場合は None を返す"""
+        headers = existing_records[0]
+        if "zaim_id" not in headers or not set(df_new.columns) <= set(headers):
+            logging.info("シートのヘッダーが新規データと一致しないため、全件書き直しを行います")
+            return None
+
+        merge = self._merge_by_id(existing_records, df_new)
+        logging.info(
+            f"差分書き込み: 新規 {len(merge.appends)}件, 更新 {len(merge.updates)}件, 変更なし {merge.unchanged}件"
+        )
+        if not merge.updates and not merge.appends:
+            logging.info("アップロード完了（変更なし）")
+            return True
+
+        # 更新・追加は1回の values.batchUpdate、並べ替えは1回の batchUpdate で送る
+        # 日付の降順はサーバー側の並べ替えで維持する（全件の再アップロードはしない）
+        with self.batched() as batch:
+            batch.update_rows(sheet.title, merge.updates)
+            batch.append_rows(sheet.title, merge.appends, data_rows=len(existing_records) - 1)
+            if "date_obj" in headers:
+                batch.sort_rows(sheet.title, headers.index("date_obj"))
+
+        logging.info("アップロード完了")
+        return True
 
     def upload_insight(self, df_insight: pd.DataFrame):
         if df_insight.empty:
@@ -378,28 +1899,49 @@ class SheetUploader:
 
         logging.info("インサイト分析結果をアップロード中...")
         try:
-            # "Monthly_Insight" という名前のシートを取得、なければ作成
-            sheet_title = "Monthly_Insight"
-            try:
-                worksheet = self.client.open_by_key(self.config.SPREADSHEET_KEY).worksheet(sheet_title)
-            except gspread.WorksheetNotFound:
-                worksheet = self.client.open_by_key(self.config.SPREADSHEET_KEY).add_worksheet(
-                    title=sheet_title, rows=100, cols=20
+            # "Monthly_Insight" という名前のシートに書き込む (なければ書き込みの前に作成)
+            with self.batched() as batch:
+                batch.replace_values(
+                    "Monthly_Insight", [df_insight.columns.values.tolist()] + df_insight.values.tolist()
                 )
+            logging.info("インサイトのアップロード完了")
+        except Exception as e:
+            logging.error(f"インサイトのアップロードエラー: {e}")
+            logging.error(traceback.format_exc())
+            self.forget_spreadsheet()
+
+    def upload_insights(self, insights: dict, title_prefix: str = "Monthly_Insight"):
+        """月ごとの分析結果 {月: DataFrame} を「Monthly_Insight_YYYY-MM」シートへまとめて書き込む
 
-            worksheet.clear()
-            worksheet.update([df_insight.columns.values.tolist()] + df_insight.values.tolist())
+        シートの作成・書式設定、値のクリア、値の書き込みは、それぞれ全月分をまとめて1回のAPI呼び出しで送る。
+        """
+        insights = {month: df for month, df in insights.items() if not df.empty}
+        if not insights:
+            return
+
+        logging.info(f"インサイト分析結果をアップロード中... ({len(insights)}ヶ月分)")
+        try:
+            with self.batched() as batch:
+                for month, df in insights.items():
+                    batch.replace_values(f"{title_prefix}_{month}", [df.columns.values.tolist()] + df.values.tolist())
             logging.info("インサイトのアップロード完了")
         except Exception as e:
             logging.error(f"インサイトのアップロードエラー: {e}")
             logging.error(traceback.format_exc())
+            self.forget_spreadsheet()
 
     def fetch_all_data(self) -> pd.DataFrame:
-        """スプレッドシートの全データを読み込んでDataFrameで返す"""
+        """スプレッドシートの全データを読み込んでDataFrameで返す（更新日時が前回と同じならローカルキャッシュを返す）"""
+        # データより先に更新日時を取る（読み込み中に更新された場合、次回は確実に取り直す）
+        revision = self._sheet_revision()
+        cached = self._load_cache(revision)
+        if cached is not None:
+            logging.info(f"シートに更新がないため、キャッシュから読み込みました ({len(cached)}件, {revision})")
+            return cached
+
         logging.info("スプレッドシートからデータを読み込み中...")
         try:
-            sheet = self.client.open_by_key(self.config.SPREADSHEET_KEY).sheet1
-            data = sheet.get_all_values()
+            data = call_sheets_api(self.config, "全データの読み込み", self.ledger_sheet().get_all_values)
 
             if not data:
                 return pd.DataFrame()
@@ -418,41 +1960,532 @@ class SheetUploader:
                 # YearMonth列を再生成（念のため）
                 df["YearMonth"] = df["date_obj"].dt.strftime("%Y-%m")
 
+            self._save_cache(df, revision)
             return df
         except Exception as e:
             logging.error(f"データ読み込みエラー: {e}")
+            self.forget_spreadsheet()
             return pd.DataFrame()
 
+    def _sheet_revision(self) -> Optional[str]:
+        """Drive API からスプレッドシートの最終更新日時を取得する（シート本体は読まない）"""
+        if not self.config.SHEET_CACHE_DIR:
+            return None
+        try:
+            return self.client.get_file_drive_metadata(self.config.SPREADSHEET_KEY)["modifiedTime"]
+        except Exception as e:
+            logging.warning(f"シートの更新日時を取得できませんでした（キャッシュを使いません）: {e}")
+            return None
+
+    def _cache_paths(self) -> tuple:
+        base = os.path.join(self.config.SHEET_CACHE_DIR, self.config.SPREADSHEET_KEY)
+        return f"{base}.pkl", f"{base}.meta.json"
+
+    def _load_cache(self, revision: Optional[str]) -> Optional[pd.DataFrame]:
+        if revision is None:
+            return None
+        data_path, meta_path = self._cache_paths()
+        try:
+            with open(meta_path, encoding="utf-8") as f:
+                if json.load(f).get("modifiedTime") != revision:
+                    return None
+            return pd.read_pickle(data_path)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logging.warning(f"キャッシュを読み込めませんでした: {e}")
+            return None
+
+    def _save_cache(self, df: pd.DataFrame, revision: Optional[str]):
+        if revision is None:
+            return
+        data_path, meta_path = self._cache_paths()
+        try:
+            os.makedirs(self.config.SHEET_CACHE_DIR, exist_ok=True)
+            # 古い更新日時を先に消し、データを書き終えてから記録する（途中で失敗しても不整合なキャッシュを使わない）
+            if os.path.exists(meta_path):
+                os.remove(meta_path)
+            df.to_pickle(data_path)
+            with open(meta_path, "w", encoding="utf-8") as f:
+                json.dump({"modifiedTime": revision, "rows": len(df)}, f)
+        except OSError as e:
+            logging.warning(f"キャッシュの保存に失敗しました: {e}")
+
+
+class DryRunUploader:
+    """DRY_RUN 時に SheetUploader の代わりに使う。加工済みデータをCSVへ書き出すだけ"""
+
+    def __init__(self, config: Config):
+        self.path = config.DRY_RUN_OUTPUT
+        self._started = False
+
+    def upload(self, df_new: pd.DataFrame) -> bool:
+        # 同じ実行内で複数回呼ばれた場合（ストリーミング時）は追記する
+        if self._started:
+            df_new.to_csv(self.path, mode="a", header=False, index=False, encoding="utf-8")
+        else:
+            df_new.to_csv(self.path, index=False, encoding="utf-8-sig")
+            self._started = True
+        logging.info(f"DRY_RUN: {len(df_new)}件を {self.path} に出力しました（スプレッドシートは更新しません）")
+        return True
+
+
+class StreamingWriter:
+    """加工済みの月データを受け取り、バックグラウンドのスレッドでローカルストア保存とアップロードを行う
+
+    書き込み待ちは最大1バッチに制限し、取得が書き込みより先行しすぎないようにする（メモリ使用量を抑える）。
+    uploader_future (シートの準備) は書き込みスレッドで最初のアップロードの直前に待ち、月の取得は先に始める。
+    """
+
+    def __init__(self, config: Config, uploader_future):
+        self.store = LedgerStore(config)
+        self.uploader_future = uploader_future
+        self.flush_months = max(1, config.STREAM_FLUSH_MONTHS)
+        self.months = 0
+        self.ok = True
+        self._buffer = []
+        self._queue = queue.Queue(maxsize=1)
+        self._thread = threading.Thread(target=self._run, name="stream-writer", daemon=True)
+        self._thread.start()
+
+    def put(self, month_key: str, df: pd.DataFrame):
+        self._buffer.append(df)
+        self.months += 1
+        logging.info(f"{month_key} を書き込み待ちに追加しました ({len(df)}件)")
+        if len(self._buffer) >= self.flush_months:
+            self._flush()
+
+    def _flush(self):
+        if self._buffer:
+            self._queue.put(self._buffer)
+            self._buffer = []
+
+    def _run(self):
+        while True:
+            batch = self._queue.get()
+            if batch is None:
+                return
+            try:
+                df = pd.concat(batch, ignore_index=True)
+                try:
+                    with stage_timer.stage("store_write") as stage:
+                        stage.rows = len(df)
+                        self.store.write(df)
+                except (ImportError, OSError, ValueError) as e:
+                    logging.error(f"ローカルストアへの保存に失敗しました: {e}")
+                with stage_timer.stage("upload") as stage:
+                    stage.rows = len(df)
+                    uploaded = self.uploader_future.result().upload(df)
+                if not uploaded:
+                    self.ok = False
+            except Exception as e:
+                logging.error(f"ストリーミング書き込みエラー: {e}")
+                self.ok = False
+
+    def close(self) -> bool:
+        """残りを書き込み、バックグラウンドの書き込み完了を待つ。全て成功した場合 True"""
+        self._flush()
+        self._queue.put(None)
+        self._thread.join()
+        return self.ok
+
+
+# --- 8. 常駐モード ---
+class ScraperDaemon:
+    """ブラウザとスプレッドシートのクライアントを保ったまま、定期実行またはローカルからのトリガーで同期を繰り返す
+
+    トリガーは localhost のHTTP (POST /run, GET /status, POST /stop) か、
+    Unixソケットへの1行コマンド (run / status / stop) で受け付ける。
+    HTTPは、ブラウザで開いたページからのリクエスト (Origin 付き・localhost 以外の Host) を拒否する。
+    """
+
+    def __init__(self, config: Config):
+        self.config = config
+        self.cycles = 0
+        self.last_result: dict = {}
+        self._trigger = threading.Event()
+        self._stop = threading.Event()
+        self._servers: list = []
+        self._stack: Optional[ExitStack] = None
+        self._scraper: Optional[ZaimScraper] = None
+        self._browser_cycles = 0
+        self._baseline_mb: Optional[float] = None
+        self._force_recycle = False
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sheet-prefetch")
+
+    # --- トリガー ---
+    def handle_command(self, command: str) -> dict:
+        command = command.strip().lower()
+        if command == "run":
+            self._trigger.set()
+            return {"accepted": True}
+        if command == "stop":
+            self.stop()
+            return {"stopping": True}
+        if command == "status":
+            return {"cycles": self.cycles, "browser_cycles": self._browser_cycles, "last": self.last_result}
+        return {"error": f"unknown command: {command}"}
+
+    def stop(self):
+        self._stop.set()
+        self._trigger.set()
+
+    def _start_servers(self):
+        daemon = self
+        if self.config.DAEMON_PORT:
+
+            allowed_hosts = {f"127.0.0.1:{self.config.DAEMON_PORT}", f"localhost:{self.config.DAEMON_PORT}"}
+            token = self.config.DAEMON_TOKEN
+
+            class HttpTrigger(BaseHTTPRequestHandler):
+                def _rejection(self) -> Optional[str]:
+                    # ブラウザはページからのリクエストに必ず Origin を付けるため、付いていれば受け付けない
+                    # (他サイトのページからの POST と、DNSリバインディング経由のアクセスを防ぐ)
+                    if self.headers.get("Origin") is not None:
+                        return "requests from web pages are not accepted"
+                    if self.headers.get("Host", "") not in allowed_hosts:
+                        return "invalid host"
+                    if token and not hmac.compare_digest(self.headers.get("Authorization", ""), f"Bearer {token}"):
+                        return "invalid token"
+                    return None
+
+                def _reply(self, command: str):
+                    rejection = self._rejection()
+                    if rejection:
+                        logging.warning(f"トリガー: リクエストを拒否しました ({rejection})")
+                        result, status = {"error": rejection}, 403
+                    else:
+                        result = daemon.handle_command(command)
+                        status = 400 if "error" in result else 200
+                    body = json.dumps(result, ensure_ascii=False).encode("utf-8")
+                    self.send_response(status)
+                    self.send_header("Content-Type", "application/json; charset=utf-8")
+                    self.send_header("Content-Length", str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+
+                def do_GET(self):
+                    # 状態の確認だけは GET でも受け付ける
+                    self._reply("status" if self.path == "/status" else "")
+
+                def do_POST(self):
+                    self._reply(self.path.strip("/"))
+
+                def log_message(self, format, *args):
+                    logging.debug(f"トリガー: {format % args}")
+
+            server = ThreadingHTTPServer(("127.0.0.1", self.config.DAEMON_PORT), HttpTrigger)
+            self._serve(server, f"http://127.0.0.1:{self.config.DAEMON_PORT}")
+
+        if self.config.DAEMON_SOCKET:
+
+            class SocketTrigger(socketserver.StreamRequestHandler):
+                def handle(self):
+                    command = self.rfile.readline().decode("utf-8")
+                    self.wfile.write(json.dumps(daemon.handle_command(command), ensure_ascii=False).encode("utf-8"))
+
+            if os.path.exists(self.config.DAEMON_SOCKET):
+                os.remove(self.config.DAEMON_SOCKET)
+            server = socketserver.ThreadingUnixStreamServer(self.config.DAEMON_SOCKET, SocketTrigger)
+            os.chmod(self.config.DAEMON_SOCKET, 0o600)
+            self._serve(server, self.config.DAEMON_SOCKET)
+
+    def _serve(self, server, address: str):
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name="daemon-trigger", daemon=True).start()
+        self._servers.append(server)
+        logging.info(f"トリガーを受け付けます: {address}")
+
+    # --- ブラウザの維持・作り直し ---
+    def _acquire_scraper(self) -> ZaimScraper:
+        reason = self._recycle_reason()
+        if reason:
+            logging.info(f"ブラウザを作り直します ({reason})")
+            self._close_scraper()
+        if self._scraper is None:
+            self._stack = ExitStack()
+            self._scraper = create_scraper(self.config, self._stack)
+            self._browser_cycles = 0
+            self._baseline_mb = None
+        return self._scraper
+
+    def _recycle_reason(self) -> Optional[str]:
+        if self._scraper is None:
+            return None
+        if self._force_recycle:
+            return "前回の実行でエラー"
+        if self.config.BROWSER_RECYCLE_CYCLES and self._browser_cycles >= self.config.BROWSER_RECYCLE_CYCLES:
+            return f"{self._browser_cycles}回使用"
+        memory = self._memory_mb()
+        if self.config.BROWSER_RECYCLE_MEMORY_MB and memory is not None and self._baseline_mb is not None:
+            if memory - self._baseline_mb >= self.config.BROWSER_RECYCLE_MEMORY_MB:
+                return f"メモリ増加 {self._baseline_mb:.0f}MB -> {memory:.0f}MB"
+        return None
+
+    def _memory_mb(self) -> Optional[float]:
+        scraper = self._scraper
+        # HTTP取得では、ブラウザは HTTP で取れなかった月のために後から起動したものを測る
+        if isinstance(scraper, HttpScraper):
+            scraper = scraper._browser_scraper
+        driver = scraper.driver if scraper is not None else None
+        return BrowserManager.memory_mb(driver) if driver is not None else None
+
+    def _close_scraper(self):
+        if self._stack is not None:
+            self._stack.close()
+        self._stack = None
+        self._scraper = None
+        self._force_recycle = False
+
+    # --- 実行 ---
+    def _prefetch(self, uploader):
+        if isinstance(uploader, SheetUploader):
+            with stage_timer.stage("sheet_prefetch"):
+                uploader.prefetch()
+        return uploader
+
+    def run_cycle(self, uploader):
+        self.cycles += 1
+        stage_timer.reset(self.config)
+        started_at = datetime.now()
+        logging.info(f"同期を開始します ({self.cycles}回目)")
+
+        # 既存シートの先読みを、ブラウザの準備・ログイン確認と並行して進める
+        uploader_future = self._executor.submit(self._prefetch, uploader)
+        error = None
+        scraper = None
+        try:
+            scraper = self._acquire_scraper()
+            scraper.waiter.records.clear()
+            scraper.completeness.clear()
+            run_cycle(self.config, scraper, uploader_future)
+        except Exception as e:
+            error = str(e)
+            self._force_recycle = True
+            logging.error(f"処理中にエラーが発生: {e}")
+        finally:
+            self._browser_cycles += 1
+            memory = self._memory_mb()
+            if self._baseline_mb is None:
+                self._baseline_mb = memory
+            self.last_result = {
+                "cycle": self.cycles,
+                "started_at": started_at.isoformat(timespec="seconds"),
+                "finished_at": datetime.now().isoformat(timespec="seconds"),
+                "ok": error is None,
+                "error": error,
+                "browser_memory_mb": round(memory, 1) if memory is not None else None,
+            }
+            stage_timer.add_section("daemon", dict(self.last_result, browser_cycles=self._browser_cycles))
+            finish_report(scraper)
+
+    def run(self):
+        uploader = create_uploader(self.config)
+        self._start_servers()
+        # SIGTERM でも実行中の同期を終えてから停止する
+        signal.signal(signal.SIGTERM, lambda signum, frame: self.stop())
+        interval = self.config.DAEMON_INTERVAL if self.config.DAEMON_INTERVAL > 0 else None
+        logging.info(f"常駐モードで起動しました (間隔: {f'{interval:.0f}秒' if interval else 'トリガー時のみ'})")
+        try:
+            while not self._stop.is_set():
+                self.run_cycle(uploader)
+                self._trigger.wait(timeout=interval)
+                self._trigger.clear()
+        except KeyboardInterrupt:
+            logging.info("中断されました")
+        finally:
+            logging.info("常駐モードを終了します")
+            for server in self._servers:
+                server.shutdown()
+                server.server_close()
+            if self.config.DAEMON_SOCKET and os.path.exists(self.config.DAEMON_SOCKET):
+                os.remove(self.config.DAEMON_SOCKET)
+            self._close_scraper()
+            self._executor.shutdown(wait=False)
+
 
 # --- メイン実行 ---
-def main():
-    config = Config()
+def create_uploader(config: Config, prefetch: bool = False):
+    """設定に応じたアップローダーを作る。prefetch=True の場合は既存シートの内容も先読みする"""
+    if config.DRY_RUN:
+        return DryRunUploader(config)
+    with stage_timer.stage("sheet_auth"):
+        uploader = SheetUploader(config)
+    if prefetch:
+        with stage_timer.stage("sheet_prefetch"):
+            uploader.prefetch()
+    return uploader
+
+
+def create_scraper(config: Config, stack: ExitStack) -> ZaimScraper:
+    """設定に応じたスクレイパーを作る。ブラウザが必要な場合は stack の中で起動する"""
+    if config.CAPTURE_MODE == "replay":
+        return ReplayScraper(config)
+    if config.FETCH_ENGINE == "http":
+        return HttpScraper(config, stack)
+    return ZaimScraper(stack.enter_context(BrowserManager(config, headless=True)), config)
+
+
+def run_batch_pipeline(config: Config, monthly_dfs: dict, sync_state: Optional[SyncState], uploader_future):
+    """全月を取得し終えてから、まとめて加工・保存・アップロードする"""
+    if sync_state:
+        fetched = len(monthly_dfs)
+        monthly_dfs = sync_state.filter_changed(monthly_dfs)
+        if fetched and not monthly_dfs:
+            logging.info("差分同期: 新しいデータがないため、加工・アップロードをスキップします。")
+            return
+    raw_df = ZaimScraper.concat_months(monthly_dfs)
+
+    if raw_df is not None and not raw_df.empty:
+        processor = DataProcessor()
+        with stage_timer.stage("process") as stage:
+            clean_df = processor.process(raw_df)
+            stage.rows = len(clean_df)
+
+        # ローカルストアを正本として先に保存し、シートはその写しとして更新する
+        try:
+            with stage_timer.stage("store_write") as stage:
+                stage.rows = len(clean_df)
+                LedgerStore(config).write(clean_df)
+        except (ImportError, OSError, ValueError) as e:
+            logging.error(f"ローカルストアへの保存に失敗しました: {e}")
+
+        uploader = uploader_future.result()
+        with stage_timer.stage("upload") as stage:
+            stage.rows = len(clean_df)
+            uploaded = uploader.upload(clean_df)
+        if uploaded and sync_state:
+            sync_state.commit()
+    else:
+        logging.info("データの取得に失敗しました。")
+
+
+def run_streaming_pipeline(config: Config, monthly_stream, sync_state: Optional[SyncState], uploader_future):
+    """月ごとに 取得→加工 を行い、保存・アップロードはバックグラウンドで次の月の取得と並行して進める"""
+    writer = StreamingWriter(config, uploader_future)
+    fetched = 0
     try:
-        config.validate()
-    except ValueError as e:
-        logging.error(e)
+        for month_key, df in monthly_stream:
+            fetched += 1
+            if sync_state and not sync_state.filter_changed({month_key: df}):
+                continue
+            with stage_timer.stage("process") as stage:
+                clean_df = DataProcessor.process(df)
+                stage.rows = len(clean_df)
+            writer.put(month_key, clean_df)
+    finally:
+        ok = writer.close()
+
+    if writer.months == 0:
+        if fetched and sync_state:
+            logging.info("差分同期: 新しいデータがないため、加工・アップロードをスキップします。")
+        else:
+            logging.info("データの取得に失敗しました。")
+    elif ok and sync_state:
+        sync_state.commit()
+
+
+def run_cycle(config: Config, scraper: ZaimScraper, uploader_future):
+    """ログイン確認 → 取得 → 加工 → 保存・アップロード を1回行う"""
+    scraper.ensure_login(SessionCache(config))
+
+    # 3ヶ月分取得
+    targets = scraper.target_months(3)
+    sync_state = SyncState(config) if config.INCREMENTAL else None
+    if sync_state:
+        targets = sync_state.select_months(targets)
+
+    if sync_state and not targets:
+        logging.info("差分同期: 取得対象の月がないため、処理を終了します。")
         return
 
-    with BrowserManager(config, headless=True) as helper:
-        scraper = ZaimScraper(helper, config)
+    if config.SCRAPE_WORKERS > 1 and type(scraper) is ZaimScraper:
+        parallel = ParallelMonthScraper(
+            config, scraper.export_cookies(), waiter=scraper.waiter, completeness=scraper.completeness
+        )
+        monthly_stream = iter(parallel.fetch_months(targets).items())
+    else:
+        monthly_stream = scraper.iter_months(targets)
 
-        try:
-            scraper.login()
+    if config.STREAMING:
+        run_streaming_pipeline(config, monthly_stream, sync_state, uploader_future)
+    else:
+        run_batch_pipeline(config, dict(monthly_stream), sync_state, uploader_future)
 
-            # 3ヶ月分取得
-            raw_df = scraper.fetch_data_loop(months=3)
 
-            if raw_df is not None and not raw_df.empty:
-                processor = DataProcessor()
-                clean_df = processor.process(raw_df)
+def warn_missing_counts(config: Config, completeness: dict):
+    """MONTH_COUNT_SELECTOR に一致する件数表示が無かった月を、実行ごとに1回の警告にまとめる
 
-                uploader = SheetUploader(config)
-                uploader.upload(clean_df)
-            else:
-                logging.info("データの取得に失敗しました。")
+    セレクタが Zaim の画面変更で合わなくなると、取得件数の確認が黙って行われなくなるため。
+    """
+    if not config.MONTH_COUNT_SELECTOR:
+        return
+    missing = sorted(month for month, result in completeness.items() if result.get("reported") is None)
+    if missing:
+        logging.warning(
+            f"件数表示 (MONTH_COUNT_SELECTOR={config.MONTH_COUNT_SELECTOR}) が見つからなかったため、"
+            f"{len(missing)}ヶ月分 ({', '.join(missing)}) の取得件数を確認できませんでした"
+        )
+
+
+def finish_report(scraper: Optional[ZaimScraper]):
+    """待機時間・取得件数を含めた実行レポートを出力する"""
+    if scraper is not None:
+        warn_missing_counts(scraper.config, scraper.completeness)
+        scraper.waiter.log_report()
+        stage_timer.add_section("waits", scraper.waiter.report())
+        stage_timer.add_section("completeness", scraper.completeness)
+    stage_timer.log_report()
+    stage_timer.write_report()
 
+
+def run_once(config: Config):
+    stage_timer.reset(config)
+
+    # シートの認証と既存データの読み込みを、ブラウザの起動・ログインと並行して進める
+    prefetch_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sheet-prefetch")
+    uploader_future = prefetch_executor.submit(create_uploader, config, True)
+    prefetch_executor.shutdown(wait=False)
+
+    with ExitStack() as stack:
+        scraper = create_scraper(config, stack)
+        try:
+            run_cycle(config, scraper, uploader_future)
         except Exception as e:
             logging.error(f"処理中にエラーが発生: {e}")
+        finally:
+            finish_report(scraper)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Zaimの明細を取得し、スプレッドシートへ同期します。")
+    parser.add_argument("--daemon", action="store_true", help="常駐して定期的に（またはトリガーで）同期を繰り返す")
+    parser.add_argument("--interval", type=float, help="常駐時の実行間隔 (秒)。0 でトリガー時のみ")
+    parser.add_argument("--port", type=int, help="トリガーを受け付ける localhost のポート")
+    parser.add_argument("--socket", type=str, help="トリガーを受け付ける Unix ソケットのパス")
+    parser.add_argument("--recycle-cycles", type=int, help="ブラウザを作り直すまでの実行回数")
+    parser.add_argument("--recycle-memory-mb", type=int, help="ブラウザを作り直すメモリ増加量 (MB)")
+    args = parser.parse_args()
+
+    # コマンドライン引数は環境変数 (.env) の設定より優先する
+    overrides = {
+        "DAEMON_INTERVAL": args.interval,
+        "DAEMON_PORT": args.port,
+        "DAEMON_SOCKET": args.socket,
+        "BROWSER_RECYCLE_CYCLES": args.recycle_cycles,
+        "BROWSER_RECYCLE_MEMORY_MB": args.recycle_memory_mb,
+    }
+    config = replace(Config(), **{k: v for k, v in overrides.items() if v is not None})
+    try:
+        config.validate()
+    except ValueError as e:
+        logging.error(e)
+        return
+
+    if args.daemon:
+        ScraperDaemon(config).run()
+    else:
+        run_once(config)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,145 @@
+"""analyze.py: InsightAnalyzer と、ローカルストア・シートからの読み込み"""
+
+import datetime
+import random
+
+import numpy as np
+import pandas as pd
+import pytest
+from dateutil.relativedelta import relativedelta
+from pandas.testing import assert_frame_equal
+
+from analyze import InsightAnalyzer, build_analyzer
+from ledger import Config, DataProcessor
+
+CATEGORIES = ["食費", "日用雑貨", "交通", "趣味・娯楽", "医療・保険", "住まい"]
+
+
+def reference_monthly_changes(df: pd.DataFrame, target_month: str) -> pd.DataFrame:
+    """一括分析を入れる前の analyze_monthly_changes (1ヶ月ずつ pivot_table で集計する実装)"""
+    prev_month = (datetime.datetime.strptime(target_month, "%Y-%m") - relativedelta(months=1)).strftime("%Y-%m")
+    df_calc = df[df["YearMonth"].isin([target_month, prev_month])]
+    if df_calc.empty:
+        return pd.DataFrame()
+
+    pivot = df_calc.pivot_table(index="カテゴリ", columns="YearMonth", values="出金", aggfunc="sum", fill_value=0)
+    for month in (target_month, prev_month):
+        if month not in pivot.columns:
+            pivot[month] = 0
+
+    analysis_df = pd.DataFrame(index=pivot.index)
+    analysis_df["当月"] = pivot[target_month]
+    analysis_df["前月"] = pivot[prev_month]
+    analysis_df["増減額"] = analysis_df["当月"] - analysis_df["前月"]
+    analysis_df["増減率(%)"] = (
+        ((analysis_df["増減額"] / analysis_df["前月"]) * 100).where(analysis_df["前月"] > 0, 0).round(1)
+    )
+    conditions = [
+        (analysis_df["増減額"] > InsightAnalyzer.THRESHOLD_AMOUNT)
+        & (analysis_df["増減率(%)"] > InsightAnalyzer.THRESHOLD_RATE),
+        (analysis_df["増減額"] > 0),
+        (analysis_df["増減額"] == 0),
+    ]
+    analysis_df["判定"] = np.select(conditions, ["⚠️使いすぎ", "増加", "-"], default="減少/維持")
+    analysis_df = analysis_df.sort_values(by="増減額", ascending=False).reset_index()
+    return analysis_df.rename(columns={"当月": f"{target_month}実績", "前月": f"{prev_month}実績"})
+
+
+def random_ledger(rng: random.Random) -> pd.DataFrame:
+    """2023〜2024年のうち一部の月だけに明細がある、加工済み形式の明細"""
+    months = pd.period_range("2023-01", "2024-12", freq="M").strftime("%Y-%m").tolist()
+    active = rng.sample(months, rng.randint(1, len(months)))
+    categories = rng.sample(CATEGORIES, rng.randint(1, len(CATEGORIES)))
+    records = []
+    for i in range(rng.randint(1, 300)):
+        income = rng.random() < 0.1
+        # 0円の明細と、同額になりやすい丸めた金額も混ぜる
+        amount = rng.choice([0, 1000, 5000, rng.randint(1, 20000)])
+        records.append(
+            {
+                "zaim_id": str(i),
+                "YearMonth": rng.choice(active),
+                "カテゴリ": rng.choice(categories),
+                "出金": 0 if income else amount,
+                "入金": amount if income else 0,
+            }
+        )
+    return pd.DataFrame(records)
+
+
+@pytest.mark.parametrize("seed", range(150))
+def test_analyze_range_matches_reference(seed: int):
+    rng = random.Random(seed)
+    df = random_ledger(rng)
+    start = pd.Period("2023-01", freq="M") + rng.randint(0, 23)
+    end = start + rng.randint(0, 5)
+    from_month, to_month = start.strftime("%Y-%m"), end.strftime("%Y-%m")
+
+    expected_by_month = {
+        month: reference_monthly_changes(df, month) for month in pd.period_range(start, end, freq="M").strftime("%Y-%m")
+    }
+
+    for analyzer in (InsightAnalyzer(df), InsightAnalyzer.from_aggregate(DataProcessor.aggregate(df))):
+        results = analyzer.analyze_range(from_month, to_month)
+        for month, expected in expected_by_month.items():
+            actual = results.get(month, pd.DataFrame())
+            if expected.empty:
+                assert actual.empty
+            else:
+                assert_frame_equal(actual, expected, check_dtype=False)
+
+
+class FakeUploader:
+    def __init__(self, df: pd.DataFrame):
+        self.df = df
+        self.fetches = 0
+
+    def fetch_all_data(self) -> pd.DataFrame:
+        self.fetches += 1
+        return self.df
+
+
+def sheet_data() -> pd.DataFrame:
+    raw = pd.DataFrame(
+        {
+            "zaim_id": ["1", "2", "3"],
+            "日付": ["9月20日", "10月5日", "10月6日"],
+            "カテゴリ": ["食費", "食費", "日用雑貨"],
+            "金額": ["¥1,000", "¥3,000", "¥800"],
+            "出金元": "お財布",
+            "入金先": "",
+            "ScrapedYear": 2024,
+            "ScrapedMonth": [9, 10, 10],
+        }
+    )
+    return DataProcessor.process(raw)
+
+
+def test_build_analyzer_falls_back_to_sheet_without_parquet(tmp_path, monkeypatch):
+    def no_pyarrow(*args, **kwargs):
+        raise ImportError("Unable to find a usable engine; tried using: 'pyarrow', 'fastparquet'.")
+
+    monkeypatch.setattr(pd.DataFrame, "to_parquet", no_pyarrow)
+    monkeypatch.setattr(pd, "read_parquet", no_pyarrow)
+    uploader = FakeUploader(sheet_data())
+    config = Config(STORE_DIR=str(tmp_path / "store"), DRY_RUN=False, CAPTURE_MODE="")
+
+    analyzer = build_analyzer(config, lambda: uploader, ["2024-10"])
+
+    assert analyzer.aggregate is None
+    assert len(analyzer.df) == 3
+    assert uploader.fetches == 1
+    assert not analyzer.analyze_monthly_changes("2024-10").empty
+
+
+def test_build_analyzer_reads_aggregate_after_seeding(tmp_path):
+    uploader = FakeUploader(sheet_data())
+    config = Config(STORE_DIR=str(tmp_path / "store"), DRY_RUN=False, CAPTURE_MODE="")
+
+    analyzer = build_analyzer(config, lambda: uploader, ["2024-10"])
+    assert analyzer.aggregate is not None
+    assert sorted(analyzer.aggregate["YearMonth"].unique()) == ["2024-09", "2024-10"]
+
+    # 取り込み済みなら2回目はシートを読まない
+    build_analyzer(config, lambda: uploader, ["2024-10"])
+    assert uploader.fetches == 1
@@ -0,0 +1,42 @@
+"""DataProcessor.parse_dates: 「10月5日（土）」形式の日付と、取得月をまたぐ年の補正"""
+
+import pandas as pd
+
+from ledger import DataProcessor
+
+
+def parse(dates: list, year: int, month: int) -> list:
+    df = pd.DataFrame({"日付": dates, "ScrapedYear": year, "ScrapedMonth": month})
+    return DataProcessor.parse_dates(df).tolist()
+
+
+def test_same_month():
+    assert parse(["10月5日", "10月31日"], 2024, 10) == [pd.Timestamp("2024-10-05"), pd.Timestamp("2024-10-31")]
+
+
+def test_december_row_on_january_page_is_previous_year():
+    assert parse(["12月31日", "1月1日"], 2025, 1) == [pd.Timestamp("2024-12-31"), pd.Timestamp("2025-01-01")]
+
+
+def test_january_row_on_december_page_is_next_year():
+    assert parse(["1月2日", "12月30日"], 2024, 12) == [pd.Timestamp("2025-01-02"), pd.Timestamp("2024-12-30")]
+
+
+def test_neighbouring_month_is_not_rolled_over():
+    assert parse(["9月30日", "11月1日"], 2024, 10) == [pd.Timestamp("2024-09-30"), pd.Timestamp("2024-11-01")]
+
+
+def test_weekday_and_holiday_suffixes():
+    dates = ["10月5日（土）", "11月4日（振替休日）", "10月14日（祝）", " 10月20日（日） "]
+    expected = ["2024-10-05", "2024-11-04", "2024-10-14", "2024-10-20"]
+    assert parse(dates, 2024, 10) == [pd.Timestamp(value) for value in expected]
+
+
+def test_unparseable_dates_become_nat():
+    result = parse(["", "不明", "13月1日", "2月30日", None], 2024, 2)
+    assert all(pd.isna(value) for value in result)
+
+
+def test_missing_scraped_year_gives_nat():
+    df = pd.DataFrame({"日付": ["10月5日"]})
+    assert pd.isna(DataProcessor.parse_dates(df).iloc[0])
@@ -0,0 +1,85 @@
+"""HttpScraper: HTTPで取った明細ページ・JSONの扱いと、ブラウザで取り直す条件"""
+
+import pytest
+
+from benchmark import make_page
+from main import Config, HttpScraper, RowParser
+
+EMPTY_LIST = '<html><body><div class="SearchResult-module__list___k2Jd9"></div>{count}</body></html>'
+
+
+class FakeHistoryClient:
+    """URL ごとに決まった (Content-Type, 本文) を返す HttpHistoryClient の代わり"""
+
+    def __init__(self, pages: dict):
+        self.pages = pages
+        self.urls = []
+
+    def fetch_page(self, url: str):
+        self.urls.append(url)
+        return self.pages.get(url)
+
+
+def make_scraper(pages: dict, **config) -> HttpScraper:
+    scraper = HttpScraper.__new__(HttpScraper)
+    scraper.config = Config(**config)
+    scraper.row_parser = RowParser()
+    scraper.capture = None
+    scraper.client = FakeHistoryClient(pages)
+    return scraper
+
+
+def html(text: str) -> tuple:
+    return ("text/html; charset=utf-8", text)
+
+
+def test_html_rows_are_parsed():
+    scraper = make_scraper({"https://zaim.net/money?month=202410": html(make_page(3))})
+    batch = scraper._fetch_http("https://zaim.net/money?month={month}", "2024-10")
+    assert len(batch) == 3
+
+
+def test_empty_html_month_with_reported_zero_is_accepted():
+    page = EMPTY_LIST.format(count='<p class="SearchResult-module__count___a1">0件</p>')
+    scraper = make_scraper({"https://zaim.net/money?month=202410": html(page)})
+
+    batch = scraper._fetch_http("https://zaim.net/money?month={month}", "2024-10")
+    assert batch is not None and len(batch) == 0
+
+
+@pytest.mark.parametrize("count", ["", "<p>0件</p>", '<p class="SearchResult-module__count___a1">読み込み中</p>'])
+def test_empty_html_month_without_reported_count_falls_back(count: str):
+    # 一覧の枠だけがあり、行がクライアント側で描画されるページはブラウザで取り直す
+    scraper = make_scraper({"https://zaim.net/money?month=202410": html(EMPTY_LIST.format(count=count))})
+    assert scraper._fetch_http("https://zaim.net/money?month={month}", "2024-10") is None
+
+
+def test_empty_html_month_with_nonzero_count_falls_back():
+    page = EMPTY_LIST.format(count='<p class="SearchResult-module__count___a1">全 1,204件</p>')
+    scraper = make_scraper({"https://zaim.net/money?month=202410": html(page)})
+    assert scraper._fetch_http("https://zaim.net/money?month={month}", "2024-10") is None
+
+
+def test_empty_html_month_without_count_selector_falls_back():
+    page = EMPTY_LIST.format(count='<p class="SearchResult-module__count___a1">0件</p>')
+    scraper = make_scraper({"https://zaim.net/money?month=202410": html(page)}, MONTH_COUNT_SELECTOR="")
+    assert scraper._fetch_http("https://zaim.net/money?month={month}", "2024-10") is None
+
+
+def test_empty_json_month_is_accepted():
+    scraper = make_scraper({"https://zaim.net/api/money?month=202410": ("application/json", '{"money": []}')})
+    batch = scraper._fetch_http("https://zaim.net/api/money?month={month}", "2024-10")
+    assert batch is not None and len(batch) == 0
+
+
+def test_paged_html_stops_at_first_empty_page():
+    url = "https://zaim.net/money?month={month}&page={page}"
+    pages = {
+        url.format(month="202410", page=1): html(make_page(2)),
+        url.format(month="202410", page=2): html(EMPTY_LIST.format(count="")),
+    }
+    scraper = make_scraper(pages)
+
+    batch = scraper._fetch_http(url, "2024-10")
+    assert len(batch) == 2
+    assert len(scraper.client.urls) == 2
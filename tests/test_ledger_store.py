@@ -0,0 +1,146 @@
+"""LedgerStore: 月パーティションへの保存・索引・集計テーブル"""
+
+import os
+from concurrent.futures import Future
+
+import pandas as pd
+
+from ledger import Config, DataProcessor, LedgerStore
+from main import DryRunUploader, run_batch_pipeline
+
+
+def ledger(rows: list, scraped: str = "2024-10") -> pd.DataFrame:
+    """(zaim_id, 日付, カテゴリ, 金額) の行から、加工済みの明細を作る"""
+    year, month = (int(v) for v in scraped.split("-"))
+    raw = pd.DataFrame(rows, columns=["zaim_id", "日付", "カテゴリ", "金額"])
+    raw = raw.assign(出金元="お財布", 入金先="", お店="", 品名="", ScrapedYear=year, ScrapedMonth=month)
+    return DataProcessor.process(raw)
+
+
+def make_store(tmp_path) -> LedgerStore:
+    return LedgerStore(Config(STORE_DIR=str(tmp_path / "store"), DRY_RUN=False, CAPTURE_MODE=""))
+
+
+def aggregate_rows(store: LedgerStore) -> list:
+    aggregated = store.read_aggregate()
+    return sorted(aggregated[["YearMonth", "カテゴリ", "出金", "件数"]].itertuples(index=False, name=None))
+
+
+def test_write_partitions_by_month(tmp_path):
+    store = make_store(tmp_path)
+    written = store.write(ledger([("1", "9月30日", "食費", "¥1,000"), ("2", "10月5日", "食費", "¥2,000")]))
+
+    assert written == ["2024-09", "2024-10"]
+    assert store.months() == ["2024-09", "2024-10"]
+    assert store.read(["2024-10"])["zaim_id"].tolist() == ["2"]
+    assert aggregate_rows(store) == [("2024-09", "食費", 1000, 1), ("2024-10", "食費", 2000, 1)]
+
+
+def test_rewrite_replaces_rows_by_zaim_id(tmp_path):
+    store = make_store(tmp_path)
+    store.write(ledger([("1", "10月5日", "食費", "¥1,000"), ("2", "10月6日", "交通", "¥300")]))
+    store.write(ledger([("1", "10月5日", "食費", "¥1,500")]))
+
+    assert sorted(store.read()["zaim_id"]) == ["1", "2"]
+    assert aggregate_rows(store) == [("2024-10", "交通", 300, 1), ("2024-10", "食費", 1500, 1)]
+
+
+def test_transaction_moved_to_another_month(tmp_path):
+    store = make_store(tmp_path)
+    store.write(ledger([("1", "10月31日", "食費", "¥1,000"), ("2", "10月5日", "交通", "¥300")]))
+
+    # 明細1の日付が11月へ変わった
+    store.write(ledger([("1", "11月1日", "食費", "¥1,000")], scraped="2024-11"))
+
+    assert store.read(["2024-10"])["zaim_id"].tolist() == ["2"]
+    assert store.read(["2024-11"])["zaim_id"].tolist() == ["1"]
+    assert aggregate_rows(store) == [("2024-10", "交通", 300, 1), ("2024-11", "食費", 1000, 1)]
+
+
+def test_month_emptied_by_move_drops_out(tmp_path):
+    store = make_store(tmp_path)
+    store.write(ledger([("1", "10月31日", "食費", "¥1,000")]))
+    store.write(ledger([("1", "11月1日", "食費", "¥1,000")], scraped="2024-11"))
+
+    assert store.months() == ["2024-11"]
+    assert store.read(["2024-10"]).empty
+    assert aggregate_rows(store) == [("2024-11", "食費", 1000, 1)]
+
+
+def test_missing_index_is_rebuilt_from_partitions(tmp_path):
+    store = make_store(tmp_path)
+    store.write(ledger([("1", "10月31日", "食費", "¥1,000"), ("2", "10月5日", "交通", "¥300")]))
+    os.remove(store._index_path())
+
+    index = store._load_index()
+    assert sorted(index.itertuples(index=False, name=None)) == [("1", "2024-10"), ("2", "2024-10")]
+
+    # 作り直した索引でも、月の移動を検出できる
+    store.write(ledger([("1", "11月1日", "食費", "¥1,000")], scraped="2024-11"))
+    assert store.read(["2024-10"])["zaim_id"].tolist() == ["2"]
+    assert os.path.exists(store._index_path())
+
+
+def test_missing_aggregate_is_rebuilt(tmp_path):
+    store = make_store(tmp_path)
+    store.write(ledger([("1", "10月5日", "食費", "¥1,000"), ("2", "10月6日", "食費", "¥500")]))
+    expected = aggregate_rows(store)
+    os.remove(store._aggregate_path())
+
+    assert aggregate_rows(store) == expected
+
+
+def test_seed_is_idempotent(tmp_path):
+    store = make_store(tmp_path)
+    store.write(ledger([("1", "10月5日", "食費", "¥1,500")]))
+    sheet = ledger([("1", "10月5日", "食費", "¥1,000"), ("2", "9月5日", "交通", "¥300")], scraped="2024-10")
+
+    assert not store.seeded
+    assert store.seed(sheet) == ["2024-09"]
+    assert store.seeded
+    rows = aggregate_rows(store)
+
+    # 取り込み済みの明細は2回目以降に書き込まない (ストアの方が新しい明細1も上書きしない)
+    assert store.seed(sheet) == []
+    assert aggregate_rows(store) == rows == [("2024-09", "交通", 300, 1), ("2024-10", "食費", 1500, 1)]
+    assert len(store.read()) == 2
+
+
+def test_dry_run_does_not_write(tmp_path):
+    config = Config(
+        STORE_DIR=str(tmp_path / "store"), DRY_RUN=True, CAPTURE_MODE="", DRY_RUN_OUTPUT=str(tmp_path / "dry.csv")
+    )
+    store = LedgerStore(config)
+    assert store.write(ledger([("1", "10月5日", "食費", "¥1,000")])) == []
+    assert store.seed(ledger([("2", "10月6日", "食費", "¥500")])) == []
+    assert not (tmp_path / "store").exists()
+
+
+def test_replay_does_not_write(tmp_path):
+    config = Config(STORE_DIR=str(tmp_path / "store"), DRY_RUN=False, CAPTURE_MODE="replay")
+    assert LedgerStore(config).write(ledger([("1", "10月5日", "食費", "¥1,000")])) == []
+    assert not (tmp_path / "store").exists()
+
+
+def test_dry_run_pipeline_leaves_store_untouched(tmp_path):
+    config = Config(
+        STORE_DIR=str(tmp_path / "store"), DRY_RUN=True, CAPTURE_MODE="", DRY_RUN_OUTPUT=str(tmp_path / "dry.csv")
+    )
+    raw = pd.DataFrame(
+        {
+            "zaim_id": ["1"],
+            "日付": ["10月5日"],
+            "カテゴリ": ["食費"],
+            "金額": ["¥1,000"],
+            "出金元": ["お財布"],
+            "入金先": [""],
+            "ScrapedYear": [2024],
+            "ScrapedMonth": [10],
+        }
+    )
+    uploader_future = Future()
+    uploader_future.set_result(DryRunUploader(config))
+    run_batch_pipeline(config, {"2024-10": raw}, None, uploader_future)
+
+    assert (tmp_path / "dry.csv").exists()
+    assert not (tmp_path / "store").exists()
@@ -0,0 +1,71 @@
+"""取得→加工→保存・アップロードのパイプライン"""
+
+import logging
+import threading
+from concurrent.futures import Future
+
+import pandas as pd
+
+from main import Config, StreamingWriter, warn_missing_counts
+
+
+class RecordingUploader:
+    def __init__(self):
+        self.uploaded = []
+
+    def upload(self, df: pd.DataFrame) -> bool:
+        self.uploaded.append(df)
+        return True
+
+
+def test_streaming_writer_waits_for_uploader_on_writer_thread():
+    config = Config(STORE_DIR="", STREAM_FLUSH_MONTHS=1)
+    uploader_future = Future()
+    writer = StreamingWriter(config, uploader_future)
+
+    # シートの準備が終わる前でも、取得した月は受け取れる
+    done = threading.Event()
+
+    def produce():
+        writer.put("2024-10", pd.DataFrame({"zaim_id": ["1"]}))
+        writer.put("2024-11", pd.DataFrame({"zaim_id": ["2"]}))
+        done.set()
+
+    threading.Thread(target=produce, daemon=True).start()
+    assert done.wait(5)
+
+    uploader = RecordingUploader()
+    uploader_future.set_result(uploader)
+    assert writer.close()
+    assert [df["zaim_id"].tolist() for df in uploader.uploaded] == [["1"], ["2"]]
+
+
+def test_streaming_writer_fails_when_uploader_cannot_be_created():
+    config = Config(STORE_DIR="", STREAM_FLUSH_MONTHS=1)
+    uploader_future = Future()
+    uploader_future.set_exception(OSError("認証に失敗しました"))
+    writer = StreamingWriter(config, uploader_future)
+    writer.put("2024-10", pd.DataFrame({"zaim_id": ["1"]}))
+
+    assert not writer.close()
+
+
+def test_missing_month_counts_are_reported_once(caplog):
+    completeness = {
+        "2024-09": {"rows": 10, "reported": None},
+        "2024-10": {"rows": 12, "reported": 12},
+        "2024-11": {"rows": 3, "reported": None},
+    }
+    with caplog.at_level(logging.WARNING):
+        warn_missing_counts(Config(MONTH_COUNT_SELECTOR=".count"), completeness)
+
+    warnings = [r for r in caplog.records if r.levelno == logging.WARNING]
+    assert len(warnings) == 1
+    assert "2ヶ月分 (2024-09, 2024-11)" in warnings[0].getMessage()
+
+
+def test_missing_month_counts_are_not_reported_without_selector(caplog):
+    with caplog.at_level(logging.WARNING):
+        warn_missing_counts(Config(MONTH_COUNT_SELECTOR=""), {"2024-10": {"rows": 1, "reported": None}})
+        warn_missing_counts(Config(MONTH_COUNT_SELECTOR=".count"), {"2024-10": {"rows": 1, "reported": 1}})
+    assert not caplog.records
@@ -0,0 +1,70 @@
+"""パーサーバックエンドの適合テスト: どのバックエンドも html.parser と同一の RowBatch を返すことを確認する
+
+ページは tests/fixtures の手書きHTML、合成ページ、CAPTURE_DIR に記録済みのページ (あれば) を使う。
+"""
+
+import glob
+import gzip
+import os
+
+import pytest
+from pandas.testing import assert_frame_equal
+
+from benchmark import make_page
+from main import ROW_PARSER_BACKENDS, Config, RowBatch, RowParser
+
+FIXTURE_DIR = os.path.join(os.path.dirname(__file__), "fixtures")
+
+
+def load_page(path: str) -> str:
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8") as f:
+        return f.read()
+
+
+def fixture_pages() -> list:
+    paths = sorted(glob.glob(os.path.join(FIXTURE_DIR, "*.html")))
+    paths += sorted(glob.glob(os.path.join(Config().CAPTURE_DIR, "*.html.gz")))
+    pages = [pytest.param(path, id=os.path.basename(path)) for path in paths]
+    pages += [pytest.param(f"synthetic:{rows}", id=f"synthetic-{rows}") for rows in (0, 1, 250)]
+    return pages
+
+
+def read_page(source: str) -> str:
+    if source.startswith("synthetic:"):
+        return make_page(int(source.split(":", 1)[1]))
+    return load_page(source)
+
+
+def parse(parser: RowParser, html: str):
+    batch = RowBatch()
+    parser.parse(html, batch)
+    return batch.to_frame()
+
+
+@pytest.mark.parametrize("source", fixture_pages())
+@pytest.mark.parametrize("backend", sorted(ROW_PARSER_BACKENDS))
+def test_backend_matches_reference(backend: str, source: str):
+    try:
+        parser = ROW_PARSER_BACKENDS[backend]()
+    except ImportError as e:
+        pytest.skip(f"{backend} は未インストール: {e}")
+
+    html = read_page(source)
+    expected = parse(RowParser(), html)
+    actual = parse(parser, html)
+    assert list(actual.columns) == list(RowBatch.COLUMNS)
+    assert actual.dtypes.equals(expected.dtypes)
+    assert_frame_equal(actual, expected)
+
+
+def test_reference_edge_cases():
+    """手書きページの期待値 (読み飛ばし・重複・欠けた項目・入れ子の項目div)"""
+    frame = parse(RowParser(), load_page(os.path.join(FIXTURE_DIR, "history_edge_cases.html")))
+    rows = {row[0]: row[1:] for row in frame.itertuples(index=False)}
+
+    assert list(rows) == [9000000001, 9000000002, 9000000003, 9000000004]
+    assert rows[9000000001] == ("10月1日（火）", "食費外食", 1200, "お財布", "", "定食屋 & カフェ", "ランチ")
+    assert rows[9000000002] == ("10月25日", "給与所得", 250000, "", "三井住友銀行", "", "")
+    assert rows[9000000003] == ("10月3日（祝）", "日用雑貨", 0, "楽天カード", "", "", "洗剤詰め替え")
+    assert rows[9000000004][2] == 0
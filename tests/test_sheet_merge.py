@@ -0,0 +1,167 @@
+"""SheetUploader: zaim_id による既存シートとの突き合わせと、全件書き直し・差分書き込み"""
+
+import random
+
+import pandas as pd
+import pytest
+
+from benchmark import make_uploader
+from main import SheetUploader
+
+HEADERS = ["zaim_id", "date_obj", "カテゴリ", "出金", "メモ"]
+NEW_COLUMNS = ["zaim_id", "date_obj", "カテゴリ", "出金"]
+
+
+def new_rows(rows: list) -> pd.DataFrame:
+    return pd.DataFrame(rows, columns=NEW_COLUMNS)
+
+
+def merge(existing: list, df_new: pd.DataFrame):
+    uploader = make_uploader(existing, "full")
+    return uploader._merge_by_id(existing, df_new)
+
+
+def test_merge_counts_updates_appends_and_unchanged():
+    existing = [
+        HEADERS,
+        ["1", "2024-10-05", "食費", "1,000", "手書きのメモ"],
+        ["2", "2024-10-04", "交通", "300", ""],
+        ["3", "2024-10-03", "日用雑貨", "800"],
+    ]
+    result = merge(
+        existing,
+        new_rows(
+            [["1", "2024-10-05", "食費", 1000], ["2", "2024-10-04", "交通", 350], ["4", "2024-10-06", "食費", 500]]
+        ),
+    )
+
+    # "1,000" と 1000 は同じ値として扱う
+    assert result.unchanged == 1
+    assert result.updates == {1: ["2", "2024-10-04", "交通", 350, ""]}
+    assert result.appends == [["4", "2024-10-06", "食費", 500, ""]]
+    assert result.apply(existing) == [
+        ["1", "2024-10-05", "食費", "1,000", "手書きのメモ"],
+        ["2", "2024-10-04", "交通", 350, ""],
+        ["3", "2024-10-03", "日用雑貨", "800", ""],
+        ["4", "2024-10-06", "食費", 500, ""],
+    ]
+
+
+def test_merge_keeps_sheet_only_columns_on_update():
+    existing = [HEADERS, ["1", "2024-10-05", "食費", "1000", "手書きのメモ"]]
+    result = merge(existing, new_rows([["1", "2024-10-05", "外食", 1200]]))
+
+    assert result.headers == HEADERS
+    assert result.updates == {0: ["1", "2024-10-05", "外食", 1200, "手書きのメモ"]}
+
+
+def test_merge_adds_new_columns_to_headers():
+    existing = [["zaim_id", "出金"], ["1", "1000"]]
+    result = merge(existing, new_rows([["1", "2024-10-05", "食費", 1000]]))
+
+    assert result.headers == ["zaim_id", "出金", "date_obj", "カテゴリ"]
+    assert result.updates == {0: ["1", 1000, "2024-10-05", "食費"]}
+
+
+def test_merge_with_duplicate_ids_in_sheet():
+    existing = [
+        HEADERS,
+        ["1", "2024-10-05", "食費", "1000", "古い行"],
+        ["2", "2024-10-04", "交通", "300", ""],
+        ["1", "2024-10-05", "食費", "1000", "新しい行"],
+    ]
+    result = merge(existing, new_rows([["1", "2024-10-05", "食費", 1500]]))
+
+    # 重複した zaim_id は最後の行を更新し、それ以前の行は残さない
+    assert result.updates == {2: ["1", "2024-10-05", "食費", 1500, "新しい行"]}
+    assert result.apply(existing) == [
+        ["2", "2024-10-04", "交通", "300", ""],
+        ["1", "2024-10-05", "食費", 1500, "新しい行"],
+    ]
+
+
+def test_merge_drops_empty_ids():
+    existing = [HEADERS, ["", "2024-10-01", "食費", "100", ""], ["1", "2024-10-05", "食費", "1000", ""], []]
+    result = merge(existing, new_rows([["", "2024-10-02", "食費", 200], ["2", "2024-10-06", "交通", 300]]))
+
+    assert result.appends == [["2", "2024-10-06", "交通", 300, ""]]
+    assert [row[0] for row in result.apply(existing)] == ["1", "2"]
+
+
+def test_merge_duplicate_ids_in_new_data_keep_last():
+    existing = [HEADERS, ["1", "2024-10-05", "食費", "1000", ""]]
+    result = merge(existing, new_rows([["2", "2024-10-06", "交通", 300], ["2", "2024-10-06", "交通", 400]]))
+
+    assert result.appends == [["2", "2024-10-06", "交通", 400, ""]]
+
+
+def normalized(values: list) -> list:
+    """シートの内容を、書き込み方法によらず比較できる形 (ヘッダーと zaim_id 順の行) にする"""
+    rows = [[SheetUploader._normalize_cell(v) for v in row] for row in values[1:]]
+    return [values[0], *sorted(rows)]
+
+
+def random_case(seed: int) -> tuple:
+    rng = random.Random(seed)
+    dates = pd.date_range("2024-01-01", "2024-12-31").strftime("%Y-%m-%d").tolist()
+    existing = [HEADERS] + [
+        [
+            str(i),
+            rng.choice(dates),
+            rng.choice(["食費", "交通"]),
+            f"{rng.randint(1, 20000):,}",
+            rng.choice(["", "メモ"]),
+        ]
+        for i in range(rng.randint(1, 50))
+    ]
+    rows = []
+    for row in rng.sample(existing[1:], rng.randint(0, len(existing) - 1)):
+        amount = int(row[3].replace(",", ""))
+        rows.append([row[0], row[1], row[2], amount if rng.random() < 0.5 else amount + 1])
+    rows += [[str(100 + i), rng.choice(dates), "食費", rng.randint(1, 20000)] for i in range(rng.randint(0, 10))]
+    rng.shuffle(rows)
+    return existing, new_rows(rows)
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_full_and_delta_uploads_give_same_sheet(seed: int):
+    existing, df_new = random_case(seed)
+    sheets = {}
+    for mode in ("full", "delta"):
+        uploader = make_uploader([list(row) for row in existing], mode)
+        assert uploader.upload(df_new)
+        sheets[mode] = normalized(uploader.client.worksheet.values)
+
+    assert sheets["full"] == sheets["delta"]
+    assert len(sheets["full"]) - 1 == len({row[0] for row in existing[1:]} | set(df_new["zaim_id"]))
+
+
+def test_delta_upload_writes_only_changed_rows():
+    existing = [
+        HEADERS,
+        ["1", "2024-10-05", "食費", "1,000", "メモ"],
+        ["2", "2024-10-04", "交通", "300", ""],
+    ]
+    uploader = make_uploader([list(row) for row in existing], "delta")
+    spreadsheet = uploader.spreadsheet()
+    sent = []
+    write = spreadsheet.values_batch_update
+    spreadsheet.values_batch_update = lambda body: sent.append(body) or write(body)
+
+    df_new = new_rows(
+        [["1", "2024-10-05", "食費", 1000], ["2", "2024-10-04", "交通", 350], ["3", "2024-10-06", "食費", 1]]
+    )
+    assert uploader.upload(df_new)
+
+    assert [data["range"] for data in sent[0]["data"]] == ["'Sheet1'!A3", "'Sheet1'!A4"]
+    assert uploader.client.worksheet.values[1] == existing[1]
+
+
+def test_delta_upload_without_changes_sends_nothing():
+    existing = [HEADERS, ["1", "2024-10-05", "食費", "1,000", "メモ"]]
+    uploader = make_uploader([list(row) for row in existing], "delta")
+    spreadsheet = uploader.spreadsheet()
+    spreadsheet.values_batch_update = spreadsheet.batch_update = None
+
+    assert uploader.upload(new_rows([["1", "2024-10-05", "食費", 1000]]))
+    assert uploader.client.worksheet.values == existing